@@ -0,0 +1,109 @@
+"""
+Encoder cost of the T5 question generation and distractor generation prompts, padded to
+SOURCE_MAX_TOKEN_LEN ('max_length', before) and dynamically to the longest prompt of the batch
+('longest', after), on the sample contexts of main.py.
+
+Run from the repository root with the distractor_gen environment:
+    python benchmark_padding.py
+
+Without access to the Hugging Face hub, a local T5 tokenizer.json can be given with --tokenizer-file, and
+--random-init builds the t5-small architecture with random weights (the encoder cost does not depend on them).
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+
+import torch
+from transformers import (
+    T5Config,
+    T5ForConditionalGeneration,
+    T5TokenizerFast as T5Tokenizer
+)
+
+from main import SAMPLE_CONTEXTS, clean_text
+
+# The prompts are built by the services themselves, without loading their models
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT_DIR, 't5_qa_gen'))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'distractor_gen'))
+from control_grid import COAC, COQC, build_control_grid, build_qa_prompt
+from distractor_prompt import build_prompt
+
+MODEL_NAME = 't5-small'
+SOURCE_MAX_TOKEN_LEN = 512
+NUM_RUNS = 5
+
+SAMPLE_QUESTION = 'When did the research in germ-free-life begin?'
+SAMPLE_ANSWER = '1928'
+
+
+def t5qg_prompts(context):
+    """The prompts of the default control-code grid for one context"""
+    return [build_qa_prompt(context, lqc, lac, COQC, COAC, mpos) for lqc, lac, mpos in build_control_grid()]
+
+
+def distractor_prompts(context):
+    return [build_prompt(SAMPLE_ANSWER, context, SAMPLE_QUESTION)]
+
+
+def encoder_flops(config, seq_len):
+    """Forward FLOPs of the encoder for one sequence: projections, feed-forward and attention scores"""
+    inner_dim = config.num_heads * config.d_kv
+    per_token = 8 * config.d_model * inner_dim + 4 * config.d_model * config.d_ff + 4 * seq_len * inner_dim
+    return config.num_layers * seq_len * per_token
+
+
+def measure(model, tokenizer, prompts, padding):
+    source_encoding = tokenizer(
+        prompts,
+        max_length=SOURCE_MAX_TOKEN_LEN,
+        padding=padding,
+        truncation=True,
+        return_attention_mask=True,
+        add_special_tokens=True,
+        return_tensors='pt'
+    )
+    seq_len = source_encoding['input_ids'].shape[1]
+
+    with torch.no_grad():
+        # warm up
+        model.encoder(input_ids=source_encoding['input_ids'], attention_mask=source_encoding['attention_mask'])
+        start = time.perf_counter()
+        for _ in range(NUM_RUNS):
+            model.encoder(input_ids=source_encoding['input_ids'], attention_mask=source_encoding['attention_mask'])
+        elapsed = (time.perf_counter() - start) / NUM_RUNS
+
+    return seq_len, encoder_flops(model.config, seq_len) * len(prompts), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tokenizer-file', help=f'T5 tokenizer.json to use instead of the one of {MODEL_NAME}')
+    parser.add_argument('--random-init', action='store_true', help=f'random weights instead of the {MODEL_NAME} ones')
+    args = parser.parse_args()
+
+    if args.tokenizer_file:
+        tokenizer = T5Tokenizer(tokenizer_file=args.tokenizer_file)
+    else:
+        tokenizer = T5Tokenizer.from_pretrained(MODEL_NAME)
+    if args.random_init:
+        # the default T5Config is the t5-small architecture
+        model = T5ForConditionalGeneration(T5Config())
+    else:
+        model = T5ForConditionalGeneration.from_pretrained(MODEL_NAME, return_dict=True)
+    model.eval()
+
+    services = [('t5_qa_gen', t5qg_prompts), ('distractor_gen', distractor_prompts)]
+    print(f"{'service':<16}{'context':>8}{'prompts':>9}{'padding':>12}{'seq len':>9}{'GFLOPs/request':>16}{'ms/request':>12}")
+    for (service, build_prompts), (idx, context) in itertools.product(services, enumerate(SAMPLE_CONTEXTS)):
+        # one request of each service encodes all of its prompts in one batch
+        prompts = build_prompts(clean_text(context))
+        for padding in ['max_length', 'longest']:
+            seq_len, flops, elapsed = measure(model, tokenizer, prompts, padding)
+            print(f"{service:<16}{idx:>8}{len(prompts):>9}{padding:>12}{seq_len:>9}{flops / 1e9:>16.2f}{elapsed * 1000:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,10 @@
-import itertools
+import atexit
+import signal
+import sys
+from typing import List, Tuple
 
 import nltk
 nltk.download('punkt')
-from nltk.translate.bleu_score import sentence_bleu, SmoothingFunction
-import numpy as np
 from flask import Flask, request, jsonify
 from peft.peft_model import PeftModel
 from transformers import (
@@ -11,22 +12,28 @@ from transformers import (
     T5TokenizerFast as T5Tokenizer
 )
 from sentence_transformers import SentenceTransformer
+from distractor_prompt import build_prompt
+from embedding_cache import create_embedding_cache
+from microbatch import create_batcher, length_buckets
+from ranking import rank_distractors
 
-smoothing_function = SmoothingFunction().method1
 model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+# LRU cache of option and answer embeddings (see embedding_cache.py)
+embedding_cache = create_embedding_cache(model)
+if embedding_cache is not None:
+    # atexit does not run when the service is stopped by SIGTERM, exit normally on it so that the cache is saved
+    atexit.register(embedding_cache.save)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
 
 
-PROMPT_PLACEHOLDER = """
-generate distractors for given context, question and answer:
-context: {context};
-question: {question};
-answer: {correct};
-</s>
-"""
-
 MODEL_NAME = 't5-small'
 SOURCE_MAX_TOKEN_LEN = 512
 TARGET_MAX_TOKEN_LEN = 64
+NUM_RETURN_SEQUENCES = 20
+# Number of prompts decoded together by one peft_model.generate call
+DISTRACTOR_BATCH_SIZE = 4
+# Pad every batch to its longest prompt instead of SOURCE_MAX_TOKEN_LEN ('max_length')
+PADDING_STRATEGY = 'longest'
 
 device = "cpu"
 tokenizer = T5Tokenizer.from_pretrained(MODEL_NAME)
@@ -42,41 +49,8 @@ peft_model.to(device)
 
 app = Flask(__name__)
 
-def cosine_sim(vec1, vec2):
-    vec1 = np.array(vec1)
-    vec2 = np.array(vec2)
-    return np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
-
-def generate_distractors(answer: str, context: str, question: str) -> str:
-    formatted_distractor = PROMPT_PLACEHOLDER.format(
-        context=context,
-        question=question,
-        correct=answer,
-    )
-    source_encoding = tokenizer(
-        formatted_distractor,
-        max_length=SOURCE_MAX_TOKEN_LEN,
-        padding='max_length',
-        truncation=True,
-        return_attention_mask=True,
-        add_special_tokens=True,
-        return_tensors='pt'
-    )
-
-    generated_ids = peft_model.generate(
-        input_ids=source_encoding['input_ids'].to(device),
-        attention_mask=source_encoding['attention_mask'].to(device),
-        num_beams=20,
-        temperature=1.5,
-        repetition_penalty=2.5,
-        top_p=0.95,
-        max_length=TARGET_MAX_TOKEN_LEN,
-        early_stopping=True,
-        use_cache=True,
-        num_return_sequences=20,
-        do_sample=True,
-    )
-
+def format_options(generated_ids) -> List[str]:
+    """Decode the sequences generated for one prompt into a list of (at least 3) candidate options"""
     preds = {
         tokenizer.decode(generated_id, skip_special_tokens=False, clean_up_tokenization_spaces=True)
         for generated_id in generated_ids
@@ -107,59 +81,78 @@ def generate_distractors(answer: str, context: str, question: str) -> str:
     # remove mark in options
     marks = ['.', ',', '?', '!', ':', ';']
     formatted_options = [option if option[-1] not in marks else option[:-1] for option in formatted_options]
-    
-    # Remove options that have high similarity with the answer (above 0.25 percentile)
-    lst_option_embeddings = model.encode(formatted_options, convert_to_tensor=True)
-    answer_embedding = model.encode([answer])
-    similarity = [cosine_sim(answer_embedding, opt_embedding).item() for opt_embedding in lst_option_embeddings]
-    selected_option_indices = [i for i, sim in enumerate(similarity) if sim > np.percentile(similarity, 25)]
-    
-    # Remove options that have seem to be the same with each other
-    removed_option_indices = []
-    for i in selected_option_indices:
-        for j in selected_option_indices:
-            if i != j:
-                semantic_similarity = cosine_sim(lst_option_embeddings[i], lst_option_embeddings[j]).item()
-                token_similarity = sentence_bleu([formatted_options[i].split()], formatted_options[j].split(), smoothing_function=smoothing_function)
-                if semantic_similarity > 0.95 or token_similarity > 0.95:
-                    if j not in removed_option_indices and i not in removed_option_indices:
-                        # Ensure that the selected option has enough distractors
-                        if len(set(selected_option_indices) - set(removed_option_indices)) > 3:
-                            removed_option_indices.append(j)
-    selected_option_indices = [i for i in selected_option_indices if i not in removed_option_indices]
-
-    best_com = None
-    best_score = -float('inf')
-    eps = 1e-6
-    for comb in itertools.combinations(selected_option_indices, 3):
-        d2d_score = 0
-        cnt = 0
-        for i in comb:
-            for j in comb:
-                if i != j:
-                    cnt += 1
-                    token_similarity = sentence_bleu([formatted_options[i].split()], formatted_options[j].split(), smoothing_function=smoothing_function)
-                    semantic_similarity = cosine_sim(lst_option_embeddings[i], lst_option_embeddings[j]).item()
-                    d2d_score = d2d_score + 1 / ((semantic_similarity + eps) + (token_similarity + eps)) 
-        d2d_score = d2d_score / cnt
-        
-        d2a_score = 0
-        cnt = 0
-        for i in comb:
-            cnt += 1
-            token_similarity = sentence_bleu([answer.split()], formatted_options[i].split(), smoothing_function=smoothing_function)
-            semantic_similarity = cosine_sim(answer_embedding, lst_option_embeddings[i]).item()
-            d2a_score = d2a_score + 1 / ((semantic_similarity + eps) + (token_similarity + eps)) 
-        d2a_score = d2a_score / cnt
-        
-        alpha = 0.5
-        total_score = 1 / (alpha / (d2d_score + eps) + (1 - alpha) / (d2a_score + eps))
-
-        if total_score > best_score:
-            best_score = total_score
-            best_com = comb
+    return formatted_options
+
+def generate_options(prompts: List[str], padding: str = PADDING_STRATEGY) -> List[List[str]]:
+    """
+    Generate candidate options for every prompt. Prompts of similar length are decoded together
+    in batches of at most DISTRACTOR_BATCH_SIZE, each padded to its longest prompt.
+    """
+    encodings = tokenizer(
+        prompts,
+        max_length=SOURCE_MAX_TOKEN_LEN,
+        truncation=True,
+        add_special_tokens=True,
+    )
 
-    return [formatted_options[i] for i in best_com]
+    options_per_prompt = [None] * len(prompts)
+    for bucket in length_buckets(encodings['input_ids'], DISTRACTOR_BATCH_SIZE):
+        source_encoding = tokenizer.pad(
+            {'input_ids': [encodings['input_ids'][i] for i in bucket]},
+            padding=padding,
+            max_length=SOURCE_MAX_TOKEN_LEN,
+            return_attention_mask=True,
+            return_tensors='pt'
+        )
+
+        generated_ids = peft_model.generate(
+            input_ids=source_encoding['input_ids'].to(device),
+            attention_mask=source_encoding['attention_mask'].to(device),
+            num_beams=20,
+            temperature=1.5,
+            repetition_penalty=2.5,
+            top_p=0.95,
+            max_length=TARGET_MAX_TOKEN_LEN,
+            early_stopping=True,
+            use_cache=True,
+            num_return_sequences=NUM_RETURN_SEQUENCES,
+            do_sample=True,
+        )
+
+        # generate returns the sequences of each prompt contiguously
+        for k, i in enumerate(bucket):
+            options_per_prompt[i] = format_options(generated_ids[k * NUM_RETURN_SEQUENCES:(k + 1) * NUM_RETURN_SEQUENCES])
+    return options_per_prompt
+
+def generate_distractors_many(items: List[Tuple[str, str, str]]) -> List[List[str]]:
+    """
+    Generate distractors for a list of (answer, context, question) triples.
+    Generation runs in batches and every candidate option and answer that is not cached yet is encoded in one call.
+    """
+    prompts = [build_prompt(answer, context, question) for answer, context, question in items]
+    options_per_item = generate_options(prompts)
+
+    answers = [answer for answer, _, _ in items]
+    all_options = [option for options in options_per_item for option in options]
+    if embedding_cache is not None:
+        embeddings = embedding_cache.encode(all_options + answers)
+    else:
+        embeddings = model.encode(all_options + answers)
+    answer_embeddings = embeddings[len(all_options):]
+
+    results = []
+    offset = 0
+    for i, options in enumerate(options_per_item):
+        option_embeddings = embeddings[offset:offset + len(options)]
+        offset += len(options)
+        results.append(rank_distractors(answers[i], options, option_embeddings, answer_embeddings[i:i + 1]))
+    return results
+
+def generate_distractors(answer: str, context: str, question: str) -> List[str]:
+    return generate_distractors_many([(answer, context, question)])[0]
+
+# Opt-in micro-batching of (answer, context, question) triples coming from concurrent requests (see microbatch.py)
+batcher = create_batcher(generate_distractors_many)
 
 @app.route('/generate_distractors', methods=['POST'])
 def generate_distractors_api():
@@ -168,8 +161,45 @@ def generate_distractors_api():
     question = data['question']
     answer = data['answer']
 
-    distractors = generate_distractors(answer, context, question)
+    if batcher is not None:
+        distractors = batcher.submit((answer, context, question))
+    else:
+        distractors = generate_distractors(answer, context, question)
     return jsonify({'distractors': distractors})
 
+@app.route('/generate_distractors_batch', methods=['POST'])
+def generate_distractors_batch_api():
+    data = request.json
+    context = data.get('context', None)
+    pairs = data.get('pairs', None)
+    if not context:
+        return jsonify({"error": "No context provided"}), 400
+    if not pairs or not isinstance(pairs, list):
+        return jsonify({"error": "No question/answer pairs provided"}), 400
+    if not all(
+        isinstance(pair, dict) and all(isinstance(pair.get(key), str) and pair[key] for key in ('question', 'answer'))
+        for pair in pairs
+    ):
+        return jsonify({"error": "Pairs must have non-empty string question and answer"}), 400
+
+    items = [(pair['answer'], context, pair['question']) for pair in pairs]
+    if batcher is not None:
+        distractors = batcher.submit_many(items)
+    else:
+        distractors = generate_distractors_many(items)
+    return jsonify({'distractors': distractors})
+
+@app.route('/batching_stats', methods=['GET'])
+def batching_stats():
+    if batcher is None:
+        return jsonify({"enabled": False})
+    return jsonify(batcher.stats())
+
+@app.route('/embedding_cache_stats', methods=['GET'])
+def embedding_cache_stats():
+    if embedding_cache is None:
+        return jsonify({"enabled": False})
+    return jsonify(embedding_cache.stats())
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=8002, debug=True)
\ No newline at end of file
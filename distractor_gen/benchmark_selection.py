@@ -0,0 +1,65 @@
+"""
+Compare select_best_triple with the exhaustive search over every 3-combination on synthetic
+candidate sets shaped like the output of the distractor model: candidates are noisy variations
+of a few topics, so most cosine similarities are positive and a few candidates are near-duplicates.
+
+    python benchmark_selection.py
+"""
+import time
+
+import numpy as np
+
+from ranking import EPS, SELECTION_TOP_K, exhaustive_best_triple, normalize_rows, select_best_triple
+
+CANDIDATE_COUNTS = [10, 20, 40, 60, 100, 200]
+NUM_TRIALS = 50
+EMBEDDING_DIM = 384
+
+
+def synthetic_scores(rng, num_candidates):
+    topics = rng.normal(size=(3, EMBEDDING_DIM))
+    shared = rng.normal(size=EMBEDDING_DIM)
+    option_vectors = normalize_rows(
+        2 * shared + topics[rng.integers(0, len(topics), num_candidates)] + rng.normal(size=(num_candidates, EMBEDDING_DIM))
+    )
+    answer_vector = normalize_rows(2 * shared + topics[0] + rng.normal(size=EMBEDDING_DIM))[0]
+    semantic_similarity = option_vectors @ option_vectors.T
+    answer_similarity = option_vectors @ answer_vector
+    # token overlaps: mostly low, some near-duplicates
+    token_similarity = rng.beta(0.5, 4, size=(num_candidates, num_candidates))
+    answer_token_similarity = rng.beta(0.5, 4, size=num_candidates)
+
+    pair_scores = 1 / ((semantic_similarity + EPS) + (token_similarity + EPS))
+    pair_scores = pair_scores + pair_scores.T
+    answer_scores = 1 / ((answer_similarity + EPS) + (answer_token_similarity + EPS))
+    return pair_scores, answer_scores
+
+
+def main(k=SELECTION_TOP_K):
+    rng = np.random.default_rng(0)
+    print(f"k={k}")
+    print(f"{'candidates':>10}{'same triple':>13}{'mean gap %':>12}{'max gap %':>11}{'exhaustive ms':>15}{'bounded ms':>12}")
+    for num_candidates in CANDIDATE_COUNTS:
+        same, gaps, exhaustive_time, bounded_time = 0, [], 0.0, 0.0
+        for _ in range(NUM_TRIALS):
+            pair_scores, answer_scores = synthetic_scores(rng, num_candidates)
+            indices = list(range(num_candidates))
+
+            start = time.perf_counter()
+            best_triple, best_score = exhaustive_best_triple(pair_scores, answer_scores, indices)
+            exhaustive_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            triple, score = select_best_triple(pair_scores, answer_scores, indices, k=k)
+            bounded_time += time.perf_counter() - start
+
+            same += triple == best_triple
+            gaps.append(max(0.0, 100 * (best_score - score) / best_score))
+        print(
+            f"{num_candidates:>10}{same / NUM_TRIALS:>13.0%}{np.mean(gaps):>12.3f}{np.max(gaps):>11.3f}"
+            f"{1000 * exhaustive_time / NUM_TRIALS:>15.2f}{1000 * bounded_time / NUM_TRIALS:>12.2f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Sentence BLEU of many hypotheses against many single references at once.
+
+Scores match nltk's `sentence_bleu([reference], hypothesis, smoothing_function=SmoothingFunction().method1)`
+with the default uniform 4-gram weights: every sentence is tokenized once, its n-grams are counted once
+into a count table, and the clipped n-gram matches of every (reference, hypothesis) pair are taken from the tables.
+"""
+from collections import Counter
+from typing import List
+
+import numpy as np
+
+MAX_NGRAM = 4
+# nltk SmoothingFunction default: precisions with no match get `EPSILON` counts
+EPSILON = 0.1
+
+
+def count_tables(sentences: List[List[str]], n: int) -> np.ndarray:
+    """Count table of the n-grams of tokenized `sentences`, table[s, g] = count of n-gram g in sentence s"""
+    counts = [Counter(zip(*[tokens[i:] for i in range(n)])) for tokens in sentences]
+    vocabulary = {}
+    for sentence_counts in counts:
+        for ngram in sentence_counts:
+            vocabulary.setdefault(ngram, len(vocabulary))
+    table = np.zeros((len(sentences), len(vocabulary)), dtype=np.int32)
+    for s, sentence_counts in enumerate(counts):
+        for ngram, count in sentence_counts.items():
+            table[s, vocabulary[ngram]] = count
+    return table
+
+
+def bleu_matrix(references: List[str], hypotheses: List[str], max_n: int = MAX_NGRAM, epsilon: float = EPSILON) -> np.ndarray:
+    """BLEU of every hypothesis against every reference, matrix[i, j] = BLEU(references[i], hypotheses[j])"""
+    tokens = [sentence.split() for sentence in references + hypotheses]
+    num_references = len(references)
+    lengths = np.array([len(sentence) for sentence in tokens], dtype=np.float64)
+    reference_lengths, hypothesis_lengths = lengths[:num_references], lengths[num_references:]
+
+    log_precision = np.zeros((len(references), len(hypotheses)))
+    no_unigram_match = None
+    for n in range(1, max_n + 1):
+        table = count_tables(tokens, n)
+        reference_table, hypothesis_table = table[:num_references], table[num_references:]
+        # clipped counts: each hypothesis n-gram is matched at most as often as it occurs in the reference
+        matches = np.stack([np.minimum(row, hypothesis_table).sum(axis=1) for row in reference_table]) \
+            if len(references) else np.zeros((0, len(hypotheses)))
+        totals = np.maximum(hypothesis_lengths - n + 1, 1)
+        precision = np.where(matches == 0, epsilon, matches) / totals
+        log_precision += np.log(precision) / max_n
+        if n == 1:
+            no_unigram_match = matches == 0
+
+    # brevity penalty against the single reference
+    with np.errstate(divide='ignore', invalid='ignore'):
+        brevity_penalty = np.where(
+            hypothesis_lengths > reference_lengths[:, None],
+            1.0,
+            np.exp(1 - reference_lengths[:, None] / hypothesis_lengths),
+        )
+    scores = brevity_penalty * np.exp(log_precision)
+    # no unigram match (which includes empty hypotheses) scores 0
+    scores[no_unigram_match] = 0.0
+    return scores
@@ -0,0 +1,20 @@
+"""
+Prompt of the T5 distractor generator, kept apart from app.py so that it can be built without loading
+the models (see benchmark_padding.py).
+"""
+
+PROMPT_PLACEHOLDER = """
+generate distractors for given context, question and answer:
+context: {context};
+question: {question};
+answer: {correct};
+</s>
+"""
+
+
+def build_prompt(answer: str, context: str, question: str) -> str:
+    return PROMPT_PLACEHOLDER.format(
+        context=context,
+        question=question,
+        correct=answer,
+    )
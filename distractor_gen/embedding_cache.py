@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List
+
+import numpy as np
+
+# The cache is configured from the environment when the service starts.
+# EMBEDDING_CACHE_SIZE=0 disables it, an empty EMBEDDING_CACHE_DIR keeps it in memory only.
+# A persistent cache is saved every EMBEDDING_CACHE_SAVE_INTERVAL seconds while it changes, 0 saves it on exit only
+EMBEDDING_CACHE_SIZE = int(os.environ.get('EMBEDDING_CACHE_SIZE', '20000'))
+EMBEDDING_CACHE_DIR = os.environ.get('EMBEDDING_CACHE_DIR', '')
+EMBEDDING_CACHE_SAVE_INTERVAL = float(os.environ.get('EMBEDDING_CACHE_SAVE_INTERVAL', '60'))
+
+MATRIX_FILE = 'embeddings.f32'
+INDEX_FILE = 'index.json'
+
+
+def normalize_key(text: str) -> str:
+    """
+    Cache key of a text. The MiniLM tokenizer is uncased and splits on whitespace,
+    so texts that only differ in case or spacing get the same embedding.
+    """
+    return ' '.join(text.lower().split())
+
+
+class EmbeddingCache:
+    """
+    Bounded LRU cache of sentence embeddings in front of `encode_fn`, which takes a list of texts
+    and returns their embeddings as a (len(texts), dim) array.
+    Embeddings are stored in the rows of a float32 matrix of `max_size` rows. With `cache_dir` the matrix is
+    memory-mapped from `cache_dir/embeddings.f32` and `save` writes the key-to-row index to `cache_dir/index.json`.
+    With `save_interval`, `encode` also saves the cache once `save_interval` seconds have passed since the last save.
+    """
+
+    def __init__(self, encode_fn, dim: int, max_size: int = 20000, cache_dir: str = None, save_interval: float = None):
+        self.encode_fn = encode_fn
+        self.dim = dim
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        self.save_interval = save_interval
+        self._last_save = time.monotonic()
+        self._lock = threading.Lock()
+        self._slots = OrderedDict()  # key -> row of the matrix, least recently used first
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._dirty = False
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            matrix_path = os.path.join(cache_dir, MATRIX_FILE)
+            index = self._load_index()
+            mode = 'r+' if index is not None and os.path.exists(matrix_path) else 'w+'
+            self._matrix = np.memmap(matrix_path, dtype=np.float32, mode=mode, shape=(max_size, dim))
+            if mode == 'r+':
+                self._slots.update((key, slot) for key, slot in index['slots'])
+        else:
+            self._matrix = np.zeros((max_size, dim), dtype=np.float32)
+        self._free_slots = sorted(set(range(max_size)) - set(self._slots.values()), reverse=True)
+
+    def _load_index(self):
+        """Return the saved index, or None when there is none or it was saved with another shape"""
+        index_path = os.path.join(self.cache_dir, INDEX_FILE)
+        if not os.path.exists(index_path):
+            return None
+        with open(index_path) as f:
+            index = json.load(f)
+        if index.get('dim') != self.dim or index.get('max_size') != self.max_size:
+            return None
+        return index
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embeddings of `texts`, only the texts that are not cached yet are passed to `encode_fn` (in one call)"""
+        keys = [normalize_key(text) for text in texts]
+        embeddings = np.empty((len(texts), self.dim), dtype=np.float32)
+
+        missing = {}  # key -> first text with that key
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._slots:
+                    self._slots.move_to_end(key)
+                    embeddings[i] = self._matrix[self._slots[key]]
+                elif key not in missing:
+                    missing[key] = texts[i]
+            self._hits += len(set(keys)) - len(missing)
+            self._misses += len(missing)
+
+        if not missing:
+            return embeddings
+
+        # encode outside of the lock, concurrent requests may encode the same text twice but never wait on each other
+        encoded = np.asarray(self.encode_fn(list(missing.values())), dtype=np.float32)
+        encoded_by_key = dict(zip(missing, encoded))
+        for i, key in enumerate(keys):
+            if key in encoded_by_key:
+                embeddings[i] = encoded_by_key[key]
+
+        with self._lock:
+            for key, embedding in encoded_by_key.items():
+                self._insert(key, embedding)
+        if self.save_interval and time.monotonic() - self._last_save >= self.save_interval:
+            self.save()
+        return embeddings
+
+    def _insert(self, key: str, embedding: np.ndarray):
+        if key in self._slots:
+            self._slots.move_to_end(key)
+            return
+        if self.cache_dir and not self._dirty:
+            # rows are about to change: drop the saved index so that a crash before the next save
+            # loses the cache instead of mapping keys to overwritten rows
+            index_path = os.path.join(self.cache_dir, INDEX_FILE)
+            if os.path.exists(index_path):
+                os.remove(index_path)
+            self._dirty = True
+        if self._free_slots:
+            slot = self._free_slots.pop()
+        else:
+            _, slot = self._slots.popitem(last=False)
+            self._evictions += 1
+        self._matrix[slot] = embedding
+        self._slots[key] = slot
+
+    def save(self):
+        """Flush the memory-mapped matrix and write the index, no-op for an in-memory or unchanged cache"""
+        if not self.cache_dir:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            self._matrix.flush()
+            index = {'dim': self.dim, 'max_size': self.max_size, 'slots': list(self._slots.items())}
+            index_path = os.path.join(self.cache_dir, INDEX_FILE)
+            with open(index_path + '.tmp', 'w') as f:
+                json.dump(index, f)
+            os.replace(index_path + '.tmp', index_path)
+            self._dirty = False
+            self._last_save = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'enabled': True,
+                'persistent': bool(self.cache_dir),
+                'max_size': self.max_size,
+                'size': len(self._slots),
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'evictions': self._evictions,
+            }
+
+
+def create_embedding_cache(model):
+    """Return an EmbeddingCache in front of the SentenceTransformer `model` configured from the environment, or None when disabled"""
+    if EMBEDDING_CACHE_SIZE <= 0:
+        return None
+    return EmbeddingCache(
+        model.encode,
+        dim=model.get_sentence_embedding_dimension(),
+        max_size=EMBEDDING_CACHE_SIZE,
+        cache_dir=EMBEDDING_CACHE_DIR or None,
+        save_interval=EMBEDDING_CACHE_SAVE_INTERVAL,
+    )
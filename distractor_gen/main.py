@@ -2,7 +2,6 @@ import itertools
 
 import nltk
 nltk.download('punkt')
-from nltk.translate.bleu_score import sentence_bleu, SmoothingFunction
 import numpy as np
 from flask import Flask, request, jsonify
 from peft.peft_model import PeftModel
@@ -12,7 +11,6 @@ from transformers import (
 )
 from sentence_transformers import SentenceTransformer
 
-smoothing_function = SmoothingFunction().method1
 model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
 
 
@@ -125,7 +123,6 @@ def generate_distractors(answer: str, context: str, question: str) -> str:
         for j in selected_option_indices:
             if i != j:
                 semantic_similarity = cosine_sim(lst_option_embeddings[i], lst_option_embeddings[j]).item()
-                token_similarity = sentence_bleu([formatted_options[i].split()], formatted_options[j].split(), smoothing_function=smoothing_function)
                 if semantic_similarity > 0.95:
                     if j not in removed_option_indices and i not in removed_option_indices:
                         removed_option_indices.append(j)
@@ -141,7 +138,6 @@ def generate_distractors(answer: str, context: str, question: str) -> str:
             for j in comb:
                 if i != j:
                     cnt += 1
-                    token_similarity = sentence_bleu([formatted_options[i].split()], formatted_options[j].split(), smoothing_function=smoothing_function)
                     semantic_similarity = cosine_sim(lst_option_embeddings[i], lst_option_embeddings[j]).item()
                     d2d_score = d2d_score + 1 / ((semantic_similarity - 0.5 + eps)) 
         d2d_score = d2d_score / cnt
@@ -150,7 +146,6 @@ def generate_distractors(answer: str, context: str, question: str) -> str:
         cnt = 0
         for i in comb:
             cnt += 1
-            token_similarity = sentence_bleu([answer.split()], formatted_options[i].split(), smoothing_function=smoothing_function)
             semantic_similarity = cosine_sim(answer_embedding, lst_option_embeddings[i]).item()
             d2a_score = d2a_score + 1 / ((semantic_similarity - 0.5 + eps)) 
         d2a_score = d2a_score / cnt
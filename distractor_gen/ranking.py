@@ -0,0 +1,155 @@
+import itertools
+from typing import List
+
+import numpy as np
+
+from bleu import bleu_matrix
+
+EPS = 1e-6
+ALPHA = 0.5
+DUPLICATE_THRESHOLD = 0.95
+# Candidate sets up to this size are searched exhaustively by select_best_triple,
+# larger ones are seeded from this many candidates and solved by branch-and-bound
+SELECTION_TOP_K = 24
+LOCAL_SEARCH_MAX_ROUNDS = 10
+
+
+def normalize_rows(embeddings) -> np.ndarray:
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if embeddings.ndim == 1:
+        embeddings = embeddings[None, :]
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+def harmonic_score(d2d_score, d2a_score):
+    """Weighted harmonic mean of the distractor-to-distractor and distractor-to-answer scores"""
+    return 1 / (ALPHA / (d2d_score + EPS) + (1 - ALPHA) / (d2a_score + EPS))
+
+
+def exhaustive_best_triple(pair_scores: np.ndarray, answer_scores: np.ndarray, indices: List[int]):
+    """
+    Score every combination of 3 of `indices` at once.
+    `pair_scores` is symmetric: pair_scores[i, j] holds the d2d terms of both (i, j) and (j, i).
+    Return the best triple and its score.
+    """
+    combs = np.array(list(itertools.combinations(indices, 3)))
+    a, b, c = combs[:, 0], combs[:, 1], combs[:, 2]
+    d2d_score = (pair_scores[a, b] + pair_scores[a, c] + pair_scores[b, c]) / 6
+    d2a_score = (answer_scores[a] + answer_scores[b] + answer_scores[c]) / 3
+    total_score = harmonic_score(d2d_score, d2a_score)
+    best = int(np.argmax(total_score))
+    return tuple(int(i) for i in combs[best]), float(total_score[best])
+
+
+def select_best_triple(pair_scores: np.ndarray, answer_scores: np.ndarray, indices: List[int], k: int = SELECTION_TOP_K):
+    """
+    Find the triple of `indices` with the highest harmonic d2d/d2a score, without scoring every combination.
+
+    Up to `k` candidates (or with k=None) the search is exhaustive. Above that:
+    1. the `k` most promising candidates (best answer score with their two best partners) are searched exhaustively,
+    2. the best triple among them is refined by swapping members with any candidate while the score improves,
+    3. branch-and-bound over pairs: the harmonic score grows with both d2d and d2a, so a pair (a, b) can only
+       lead to a triple scoring at most harmonic((W[a, b] + max W[a] + max W[b]) / 6, (q[a] + q[b] + max q) / 3).
+       Pairs are expanded by decreasing bound until the bound falls below the best score found,
+       which makes the result exact. The bound needs positive scores, otherwise the search is exhaustive.
+
+    Return the best triple (in ascending order) and its score.
+    """
+    if k is None or len(indices) <= k:
+        return exhaustive_best_triple(pair_scores, answer_scores, indices)
+
+    indices = np.asarray(indices)
+    sub_pair_scores = pair_scores[np.ix_(indices, indices)]
+    sub_answer_scores = answer_scores[indices]
+    masked = sub_pair_scores.copy()
+    np.fill_diagonal(masked, -np.inf)
+    if np.any(masked[np.triu_indices(len(indices), 1)] <= 0) or np.any(sub_answer_scores <= 0):
+        return exhaustive_best_triple(pair_scores, answer_scores, indices.tolist())
+
+    def best_third(x, y):
+        candidate_scores = harmonic_score(
+            (sub_pair_scores[x, y] + sub_pair_scores[x] + sub_pair_scores[y]) / 6,
+            (sub_answer_scores[x] + sub_answer_scores[y] + sub_answer_scores) / 3,
+        )
+        candidate_scores[[x, y]] = -np.inf
+        candidate = int(np.argmax(candidate_scores))
+        return candidate, float(candidate_scores[candidate])
+
+    # 1. Exhaustive search over the shortlist
+    top2 = -np.partition(-masked, 1, axis=1)[:, :2]
+    potential = harmonic_score(top2.sum(axis=1) / 4, sub_answer_scores)
+    shortlist = sorted(np.argsort(-potential, kind='stable')[:k].tolist())
+    triple, best_score = exhaustive_best_triple(sub_pair_scores, sub_answer_scores, shortlist)
+
+    # 2. Local search
+    triple = list(triple)
+    for _ in range(LOCAL_SEARCH_MAX_ROUNDS):
+        improved = False
+        for position in range(3):
+            x, y = [triple[p] for p in range(3) if p != position]
+            candidate, score = best_third(x, y)
+            if score > best_score:
+                triple[position] = candidate
+                best_score = score
+                improved = True
+        if not improved:
+            break
+
+    # 3. Branch-and-bound over pairs
+    row_max = top2[:, 0]
+    first, second = np.triu_indices(len(indices), 1)
+    bounds = harmonic_score(
+        (sub_pair_scores[first, second] + row_max[first] + row_max[second]) / 6,
+        (sub_answer_scores[first] + sub_answer_scores[second] + sub_answer_scores.max()) / 3,
+    )
+    for pair in np.argsort(-bounds):
+        if bounds[pair] <= best_score:
+            break
+        x, y = int(first[pair]), int(second[pair])
+        candidate, score = best_third(x, y)
+        if score > best_score:
+            triple = [x, y, candidate]
+            best_score = score
+
+    return tuple(int(indices[i]) for i in sorted(triple)), best_score
+
+
+def rank_distractors(answer: str, formatted_options: List[str], option_embeddings, answer_embedding) -> List[str]:
+    """
+    Select the 3 options that are the most different from each other and from the answer.
+    Every similarity is computed once per request: the option-by-option cosine similarity matrix,
+    the option-answer cosine similarity vector and the pairwise BLEU matrices.
+    """
+    option_vectors = normalize_rows(option_embeddings)
+    answer_vector = normalize_rows(answer_embedding)[0]
+    semantic_similarity = option_vectors @ option_vectors.T
+    answer_similarity = option_vectors @ answer_vector
+    # the answer is the last reference, so every sentence is tokenized and counted once
+    bleu = bleu_matrix(formatted_options + [answer], formatted_options)
+    token_similarity, answer_token_similarity = bleu[:-1], bleu[-1]
+
+    # Remove options that have high similarity with the answer (above 0.25 percentile)
+    threshold = np.percentile(answer_similarity, 25)
+    selected_option_indices = [i for i in range(len(formatted_options)) if answer_similarity[i] > threshold]
+    if len(selected_option_indices) < 3:
+        # Too few options to pick from (e.g. only 3 candidates), keep all of them
+        selected_option_indices = list(range(len(formatted_options)))
+
+    # Remove options that have seem to be the same with each other
+    is_duplicate = (semantic_similarity > DUPLICATE_THRESHOLD) | (token_similarity > DUPLICATE_THRESHOLD)
+    removed_option_indices = set()
+    for i in selected_option_indices:
+        for j in selected_option_indices:
+            if i != j and is_duplicate[i, j]:
+                if j not in removed_option_indices and i not in removed_option_indices:
+                    # Ensure that the selected option has enough distractors
+                    if len(selected_option_indices) - len(removed_option_indices) > 3:
+                        removed_option_indices.add(j)
+    selected_option_indices = [i for i in selected_option_indices if i not in removed_option_indices]
+
+    # Pick the triple with the best harmonic d2d/d2a score
+    pair_scores = 1 / ((semantic_similarity + EPS) + (token_similarity + EPS))
+    pair_scores = pair_scores + pair_scores.T
+    answer_scores = 1 / ((answer_similarity + EPS) + (answer_token_similarity + EPS))
+    best_com, _ = select_best_triple(pair_scores, answer_scores, selected_option_indices)
+    return [formatted_options[i] for i in best_com]
@@ -1,16 +1,31 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import requests
 from tqdm import tqdm
 import logging
 import os
 
-# Set up logging
-logging.basicConfig(filename='mcq_generation.log', level=logging.ERROR,
-                    format='%(asctime)s:%(levelname)s:%(message)s')
-
-PARAPHRASE_SERVICE_URL = 'http://localhost:7999/paraphrase'
+PARAPHRASE_SERVICE_URL = 'http://localhost:7999/paraphrase_batch'
 T5QG_SERVICE_URL = 'http://localhost:8000/generate_t5_qa'
 QG_SERVICE_URL = 'http://localhost:8001/generate_qa'
-DG_SERVICE_URL = 'http://localhost:8002/generate_distractors'
+DG_SERVICE_URL = 'http://localhost:8002/generate_distractors_batch'
+
+# Number of questions sent in one /paraphrase_batch and /generate_distractors_batch call
+PARAPHRASE_CHUNK_SIZE = 32
+
+# Concurrent orchestrator: maximum number of in-flight requests per downstream service
+USE_CONCURRENT_ORCHESTRATOR = False
+SERVICE_CONCURRENCY = {
+    PARAPHRASE_SERVICE_URL: 2,
+    T5QG_SERVICE_URL: 1,
+    QG_SERVICE_URL: 1,
+    DG_SERVICE_URL: 2,
+}
+
+SAMPLE_CONTEXTS = [
+    """The Lobund Institute grew out of pioneering research in germ-free-life which began in 1928. This area of research originated in a question posed by Pasteur as to whether animal life was possible without bacteria. Though others had taken up this idea, their research was short lived and inconclusive. Lobund was the first research organization to answer definitively, that such life is possible and that it can be prolonged through generations. But the objective was not merely to answer Pasteur's question but also to produce the germ free animal as a new tool for biological and medical research. This objective was reached and for years Lobund was a unique center for the study and production of germ free animals and for their use in biological and medical investigations. Today the work has spread to other universities. In the beginning it was under the Department of Biology and a program leading to the master's degree accompanied the research program. In the 1940s Lobund achieved independent status as a purely research organization and in 1950 was raised to the status of an Institute. In 1958 it was brought back into the Department of Biology as integral part of that department, but with its own program leading to the degree of PhD in Gnotobiotics.""",
+    # """The Yanomami live along the rivers of the rainforest in the north of Brazil. They have lived in the rainforest for about 10,000 years and they use more than 2,000 different plants for food and for medicine. But in 1988, someone found gold in their forest, and suddenly 45,000 people came to the forest and began looking for gold. They cut down the forest to make roads. They made more than a hundred airports. The Yanomami people lost land and food. Many died because new diseases came to the forest with the strangers.In 1987, they closed fifteen roads for eight months. No one cut down any trees during that time. In Panama, the Kuna people saved their forest. They made a forest park which tourists pay to visit. The Gavioes people of Brazil use the forest, but they protect it as well. They find the Brazil nuts which grow on the forest trees.""",
+]
 
 def clean_text(text: str):
     text = text.replace('\n', ' ')
@@ -33,23 +48,12 @@ def check_service(url, payload):
         logging.error(f"Failed to connect to service at {url}: {str(e)}")
         return None
 
-def generate_mcq(context, output_path):
-    context = clean_text(context)
-    # clear file content
-    with open('generated_mcqs.txt', 'w', encoding='utf-8') as file:
-        file.write('')
-    
-    qg_payload = {
-        'context': context,
-        'enhance_level': 2,
-        'limit': 50,
-        }
-    rule_qg_response = check_service(QG_SERVICE_URL, qg_payload)
-    t5qg_response = check_service(T5QG_SERVICE_URL, qg_payload)
-    
-    if rule_qg_response is None or t5qg_response is None:
-        raise Exception('Failed to generate questions')
+async def check_service_async(url, payload, semaphores):
+    """Run `check_service` in a worker thread, bounded by the semaphore of the service"""
+    async with semaphores[url]:
+        return await asyncio.to_thread(check_service, url, payload)
 
+def collect_questions(rule_qg_response, t5qg_response):
     questions = []
     for res in rule_qg_response:
         questions.append(res)
@@ -69,71 +73,178 @@ def generate_mcq(context, output_path):
         if question['question'] not in unique_questions:
             unique_questions.append(question['question'])
             unique_qas.append(question)
+    return unique_qas
 
-    mcqs = []
-    print("Found unique questions: ", len(unique_qas))
-    for question_data in tqdm(unique_qas, total=len(unique_qas)):
-        question = question_data['question']
-        answer = question_data['answer']
-        q_type = question_data['type']
-        
-        paraphrase_payload = {
-            'question': question
-        }
-        paraphrase_response = check_service(PARAPHRASE_SERVICE_URL, paraphrase_payload)
-        if paraphrase_response is None:
-            raise Exception('Failed to paraphrase question')
-        
-        paraphrased_question = paraphrase_response['paraphrased_texts'][0]
-        
+def write_mcq(output_path, mcq):
+    with open(output_path, 'a', encoding='utf-8') as file:
+        file.write(f"Original Question: {mcq['original question']}\n")
+        file.write(f"Original Answer: {mcq['original answer']}\n")
+        file.write(f"Question: {mcq['question']}\n")
+        file.write(f"A: {mcq['answer']}\n")
+        file.write(f"B: {mcq['distractors'][0]}\n")
+        file.write(f"C: {mcq['distractors'][1]}\n")
+        file.write(f"D: {mcq['distractors'][2]}\n")
+        file.write(f"Type: {mcq['type']}\n\n")
+
+def paraphrase_inputs(qas):
+    """Texts to paraphrase for the given QA pairs: every question, and the answers that are long enough"""
+    texts = []
+    for qa in qas:
+        texts.append(qa['question'])
         # only paraphrase the answer if it is long enough
-        if len(answer) < 10:
-            paraphrased_answer = answer
+        if len(qa['answer']) >= 10:
+            texts.append(qa['answer'])
+    return texts
+
+def apply_paraphrases(qas, paraphrase_response):
+    """Return (paraphrased question, paraphrased answer) per QA pair, in the order built by `paraphrase_inputs`"""
+    if paraphrase_response is None:
+        raise Exception('Failed to paraphrase questions')
+    paraphrased_texts = iter(paraphrase_response['paraphrased_texts'])
+    results = []
+    for qa in qas:
+        paraphrased_question = next(paraphrased_texts)[0]
+        if len(qa['answer']) >= 10:
+            paraphrased_answer = next(paraphrased_texts)[0]
         else:
-            paraphrase_payload = {
-                'question': answer
-            }
-            paraphrase_response = check_service(PARAPHRASE_SERVICE_URL, paraphrase_payload)
-            if paraphrase_response is None:
-                raise Exception('Failed to paraphrase answer')        
-            paraphrased_answer = paraphrase_response['paraphrased_texts'][0]
-            
-        dg_payload = {
-            'context': context,
-            'question': paraphrased_question,
-            'answer':  paraphrased_answer       
-        }
-        dg_response = check_service(DG_SERVICE_URL, dg_payload)
-        if dg_response is None:
-            raise Exception('Failed to generate distractors')
-        
-        distractors = dg_response.get('distractors')
-        mcq = {
-            'original question': question,
-            'original answer': answer,
+            paraphrased_answer = qa['answer']
+        results.append((paraphrased_question, paraphrased_answer))
+    return results
+
+def chunk_questions(qas):
+    return [qas[start:start + PARAPHRASE_CHUNK_SIZE] for start in range(0, len(qas), PARAPHRASE_CHUNK_SIZE)]
+
+def distractor_payload(context, paraphrases):
+    return {
+        'context': context,
+        'pairs': [
+            {'question': paraphrased_question, 'answer': paraphrased_answer}
+            for paraphrased_question, paraphrased_answer in paraphrases
+        ]
+    }
+
+def build_mcqs(qas, paraphrases, dg_response):
+    if dg_response is None:
+        raise Exception('Failed to generate distractors')
+    mcqs = []
+    for question_data, (paraphrased_question, paraphrased_answer), distractors in zip(qas, paraphrases, dg_response['distractors']):
+        mcqs.append({
+            'original question': question_data['question'],
+            'original answer': question_data['answer'],
             'question': paraphrased_question,
             'answer': paraphrased_answer,
             'distractors': distractors,
-            'type': q_type
+            'type': question_data['type']
+        })
+    return mcqs
+
+def generate_mcq(context, output_path, concurrent=USE_CONCURRENT_ORCHESTRATOR, concurrency=None):
+    if concurrent:
+        return asyncio.run(generate_mcq_async(context, output_path, concurrency))
+
+    context = clean_text(context)
+    # clear file content
+    with open('generated_mcqs.txt', 'w', encoding='utf-8') as file:
+        file.write('')
+    
+    qg_payload = {
+        'context': context,
+        'enhance_level': 2,
+        'limit': 50,
         }
-        mcqs.append(mcq)
-        
-        with open(output_path, 'a', encoding='utf-8') as file:
-            file.write(f"Original Question: {mcq['original question']}\n")
-            file.write(f"Original Answer: {mcq['original answer']}\n")
-            file.write(f"Question: {mcq['question']}\n")
-            file.write(f"A: {mcq['answer']}\n")
-            file.write(f"B: {mcq['distractors'][0]}\n")
-            file.write(f"C: {mcq['distractors'][1]}\n")
-            file.write(f"D: {mcq['distractors'][2]}\n")
-            file.write(f"Type: {mcq['type']}\n\n")
+    rule_qg_response = check_service(QG_SERVICE_URL, qg_payload)
+    t5qg_response = check_service(T5QG_SERVICE_URL, qg_payload)
     
+    if rule_qg_response is None or t5qg_response is None:
+        raise Exception('Failed to generate questions')
+
+    unique_qas = collect_questions(rule_qg_response, t5qg_response)
+
+    mcqs = []
+    print("Found unique questions: ", len(unique_qas))
+    for chunk in tqdm(chunk_questions(unique_qas)):
+        paraphrase_response = check_service(PARAPHRASE_SERVICE_URL, {'texts': paraphrase_inputs(chunk)})
+        paraphrases = apply_paraphrases(chunk, paraphrase_response)
+        dg_response = check_service(DG_SERVICE_URL, distractor_payload(context, paraphrases))
+        for mcq in build_mcqs(chunk, paraphrases, dg_response):
+            mcqs.append(mcq)
+            write_mcq(output_path, mcq)
+    
+    return mcqs
+
+async def process_chunk_async(context, chunk, semaphores, pbar):
+    """Paraphrase a chunk of questions in one call, then generate their distractors in one call"""
+    paraphrase_response = await check_service_async(PARAPHRASE_SERVICE_URL, {'texts': paraphrase_inputs(chunk)}, semaphores)
+    paraphrases = apply_paraphrases(chunk, paraphrase_response)
+    dg_response = await check_service_async(DG_SERVICE_URL, distractor_payload(context, paraphrases), semaphores)
+    pbar.update(len(chunk))
+    return build_mcqs(chunk, paraphrases, dg_response)
+
+async def generate_mcq_async(context, output_path, concurrency=None):
+    """
+    Concurrent variant of `generate_mcq`. Both question generators are queried at the same time
+    and every chunk of questions moves on to distractor generation as soon as its paraphrases are back,
+    so the paraphrase and distractor stages overlap instead of waiting on one socket at a time.
+    `concurrency` maps a service url to its maximum number of in-flight requests
+    (defaults to SERVICE_CONCURRENCY).
+    """
+    limits = dict(SERVICE_CONCURRENCY)
+    if concurrency:
+        limits.update(concurrency)
+    semaphores = {url: asyncio.Semaphore(limit) for url, limit in limits.items()}
+    # enough worker threads so that every service can use its whole limit at once
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=sum(limits.values())))
+
+    context = clean_text(context)
+    # clear file content
+    with open('generated_mcqs.txt', 'w', encoding='utf-8') as file:
+        file.write('')
+
+    qg_payload = {
+        'context': context,
+        'enhance_level': 2,
+        'limit': 50,
+        }
+    rule_qg_response, t5qg_response = await asyncio.gather(
+        check_service_async(QG_SERVICE_URL, qg_payload, semaphores),
+        check_service_async(T5QG_SERVICE_URL, qg_payload, semaphores),
+    )
+
+    if rule_qg_response is None or t5qg_response is None:
+        raise Exception('Failed to generate questions')
+
+    unique_qas = collect_questions(rule_qg_response, t5qg_response)
+    print("Found unique questions: ", len(unique_qas))
+
+    mcqs = []
+    error = None
+    with tqdm(total=len(unique_qas)) as pbar:
+        tasks = [
+            asyncio.create_task(process_chunk_async(context, chunk, semaphores, pbar))
+            for chunk in chunk_questions(unique_qas)
+        ]
+        # write every chunk once it and the chunks before it are done, to keep the output file in question order.
+        # A failed chunk does not discard the MCQs of the others, its error is raised after all of them are written
+        for task in tasks:
+            try:
+                chunk_mcqs = await task
+            except Exception as e:
+                error = error or e
+                continue
+            for mcq in chunk_mcqs:
+                mcqs.append(mcq)
+                write_mcq(output_path, mcq)
+
+    if error is not None:
+        raise error
     return mcqs
 
 if __name__ == '__main__':
-    context1 = """The Lobund Institute grew out of pioneering research in germ-free-life which began in 1928. This area of research originated in a question posed by Pasteur as to whether animal life was possible without bacteria. Though others had taken up this idea, their research was short lived and inconclusive. Lobund was the first research organization to answer definitively, that such life is possible and that it can be prolonged through generations. But the objective was not merely to answer Pasteur's question but also to produce the germ free animal as a new tool for biological and medical research. This objective was reached and for years Lobund was a unique center for the study and production of germ free animals and for their use in biological and medical investigations. Today the work has spread to other universities. In the beginning it was under the Department of Biology and a program leading to the master's degree accompanied the research program. In the 1940s Lobund achieved independent status as a purely research organization and in 1950 was raised to the status of an Institute. In 1958 it was brought back into the Department of Biology as integral part of that department, but with its own program leading to the degree of PhD in Gnotobiotics."""
-    # context2 = """The Yanomami live along the rivers of the rainforest in the north of Brazil. They have lived in the rainforest for about 10,000 years and they use more than 2,000 different plants for food and for medicine. But in 1988, someone found gold in their forest, and suddenly 45,000 people came to the forest and began looking for gold. They cut down the forest to make roads. They made more than a hundred airports. The Yanomami people lost land and food. Many died because new diseases came to the forest with the strangers.In 1987, they closed fifteen roads for eight months. No one cut down any trees during that time. In Panama, the Kuna people saved their forest. They made a forest park which tourists pay to visit. The Gavioes people of Brazil use the forest, but they protect it as well. They find the Brazil nuts which grow on the forest trees."""
-    contexts = [context1]
+    # Set up logging
+    logging.basicConfig(filename='mcq_generation.log', level=logging.ERROR,
+                        format='%(asctime)s:%(levelname)s:%(message)s')
+
+    contexts = SAMPLE_CONTEXTS
     for i, context in enumerate(contexts):     
         save_path = os.path.join(os.getcwd(), f'context{i}.txt')
         with open(save_path, 'w', encoding='utf-8') as file:
@@ -2,6 +2,7 @@ from flask import Flask, request, jsonify
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
 import os
 import requests
+from microbatch import create_batcher, length_buckets
 
 device = "cpu"
 local_model_dir = "./models"
@@ -33,8 +34,12 @@ def load_model_and_tokenizer():
 
 tokenizer, model = load_model_and_tokenizer()
 
-def paraphrase(
-    question,
+# Number of texts encoded and generated together by /paraphrase_batch
+PARAPHRASE_BATCH_SIZE = 16
+
+def paraphrase_batch(
+    texts,
+    batch_size=PARAPHRASE_BATCH_SIZE,
     num_beams=10,
     num_beam_groups=5,
     num_return_sequences=1,
@@ -43,23 +48,40 @@ def paraphrase(
     no_repeat_ngram_size=3,
     max_length=128
 ):
-    input_ids = tokenizer(
-        f'paraphrase: {question}',
-        return_tensors="pt", padding="longest",
+    """Paraphrase a list of texts in length-bucketed padded batches, return one list of paraphrases per text"""
+    encodings = tokenizer(
+        [f'paraphrase: {text}' for text in texts],
         max_length=max_length,
         truncation=True,
-    ).input_ids.to(device)
-    
-    outputs = model.generate(
-        input_ids, repetition_penalty=repetition_penalty,
-        num_return_sequences=num_return_sequences, no_repeat_ngram_size=no_repeat_ngram_size,
-        num_beams=num_beams, num_beam_groups=num_beam_groups,
-        max_length=max_length, diversity_penalty=diversity_penalty,
     )
 
-    res = tokenizer.batch_decode(outputs, skip_special_tokens=True)
+    results = [None] * len(texts)
+    for bucket in length_buckets(encodings['input_ids'], batch_size):
+        source_encoding = tokenizer.pad(
+            {'input_ids': [encodings['input_ids'][i] for i in bucket]},
+            return_tensors="pt", padding="longest",
+        )
+
+        outputs = model.generate(
+            input_ids=source_encoding.input_ids.to(device),
+            attention_mask=source_encoding.attention_mask.to(device),
+            repetition_penalty=repetition_penalty,
+            num_return_sequences=num_return_sequences, no_repeat_ngram_size=no_repeat_ngram_size,
+            num_beams=num_beams, num_beam_groups=num_beam_groups,
+            max_length=max_length, diversity_penalty=diversity_penalty,
+        )
+
+        res = tokenizer.batch_decode(outputs, skip_special_tokens=True)
+        for k, i in enumerate(bucket):
+            results[i] = res[k * num_return_sequences:(k + 1) * num_return_sequences]
 
-    return res
+    return results
+
+def paraphrase(question, **kwargs):
+    return paraphrase_batch([question], **kwargs)[0]
+
+# Opt-in micro-batching of texts coming from concurrent requests (see microbatch.py)
+batcher = create_batcher(paraphrase_batch)
 
 app = Flask(__name__)
 
@@ -70,10 +92,36 @@ def paraphrase_handler():
     if not question:
         return jsonify({"error": "No question provided"}), 400
     try:
-        paraphrased_texts = paraphrase(question)
+        if batcher is not None:
+            paraphrased_texts = batcher.submit(question)
+        else:
+            paraphrased_texts = paraphrase(question)
         return jsonify({"paraphrased_texts": paraphrased_texts})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/paraphrase_batch', methods=['POST'])
+def paraphrase_batch_handler():
+    data = request.json
+    texts = data.get('texts', None)
+    if not texts or not isinstance(texts, list):
+        return jsonify({"error": "No texts provided"}), 400
+    if not all(isinstance(text, str) and text for text in texts):
+        return jsonify({"error": "Texts must be non-empty strings"}), 400
+    try:
+        if batcher is not None:
+            paraphrased_texts = batcher.submit_many(texts)
+        else:
+            paraphrased_texts = paraphrase_batch(texts)
+        return jsonify({"paraphrased_texts": paraphrased_texts})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/batching_stats', methods=['GET'])
+def batching_stats():
+    if batcher is None:
+        return jsonify({"enabled": False})
+    return jsonify(batcher.stats())
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=7999, debug=False)
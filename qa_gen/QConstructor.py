@@ -1,38 +1,46 @@
+import random
+from itertools import islice
 from typing import List, Tuple
 
 from QDeconstructor import QDeconstructionResult
+from doc_index import DocIndex
 from helper import Helper
 import utils
 from spacy.tokens import Token
-from tqdm import tqdm
+
+# sort key and order of the selection methods of QConstructor.iterQuestions, 'random' and 'only_type' do not sort
+SELECTION_METHODS = {
+    'random': None,
+    'only_type': None,
+    'longest': (lambda s: len(s['question']), True),
+    'shortest': (lambda s: len(s['question']), False),
+    'alphabetical': (lambda s: s['question'], False),
+    'reverse_alphabetical': (lambda s: s['question'], True),
+    'answer_length': (lambda s: len(s['answer']), False),
+    'reverse_answer_length': (lambda s: len(s['answer']), True),
+}
 
 class QConstructor:
     
-    def __init__(self, doc, idx_srls, enhance_level: int = 0):
-        self.doc = doc
+    def __init__(self, doc_index: DocIndex, enhance_level: int = 0):
+        self.doc = doc_index.doc
+        self.doc_index = doc_index
         self.enhance_level = enhance_level
         
-        self.clusters = []
-        for cluster in self.doc._.coref_clusters:
-            spans_in_cluster = []
+        # token lists of the coref clusters and SRLs are shared with QDeconstructor
+        self.clusters = doc_index.clusters
+        self.srls = doc_index.srls
+
+        # coref lookup table: token index -> (cluster index, span, antecedent) of every cluster span containing the token,
+        # in the order of the clusters and of their spans
+        self.coref_table = {}
+        for cluster_idx, cluster in enumerate(self.clusters):
             for span in cluster:
-                tokens_in_span = []
-                for token in self.doc:
-                    if span[0] <= token.idx < span[1]:
-                        tokens_in_span.append(token)
-                spans_in_cluster.append(tokens_in_span)
-            self.clusters.append(spans_in_cluster)  
-            
-        self.srls = []
-        for srl in idx_srls:
-            mod_srl = {}
-            for k, v in srl.items():
-                span = []
-                for token in self.doc:
-                    if v[0] <= token.idx < v[1]:
-                        span.append(token)
-                mod_srl[k] = span
-            self.srls.append(mod_srl) 
+                for token in span:
+                    self.coref_table.setdefault(token.i, []).append((cluster_idx, span, cluster[0]))
+
+        # SRL index -> clause built by _clause_without_subject
+        self._clauses = {}
             
 
     def _is_in_same_cluster(self, token1: Token, token2: Token) -> bool:
@@ -62,11 +70,39 @@ class QConstructor:
         Tuple[List[Token], List[Token]]
             
         """
-        for cluster in self.clusters:
-            for span in cluster:
-                if token in span:
-                    return cluster[0], span
+        coref_entries = self._get_coref_entries(token)
+        if coref_entries:
+            _, span, antecedent = coref_entries[0]
+            return antecedent, span
         return [token], [token]
+
+    def _get_coref_entries(self, token: Token) -> List[Tuple[int, List[Token], List[Token]]]:
+        """(cluster index, span, antecedent) of every cluster span containing the token, empty if it is in none"""
+        if token.doc is not self.doc:
+            return []
+        return self.coref_table.get(token.i, [])
+    
+    def _subject_srl_indices(self, spans: List[List[Token]]) -> List[int]:
+        """Indices of the SRLs with a predicate whose subject contains a token of one of the spans, by span and then in SRL order"""
+        srl_indices = []
+        seen = set()
+        for span in spans:
+            for srl_idx in sorted(self.doc_index.srls_with_subject_in(span) - seen):
+                srl_indices.append(srl_idx)
+                seen.add(srl_idx)
+        return srl_indices
+
+    def _clause_without_subject(self, srl_idx: int) -> List[Token]:
+        """Simplified arguments of an SRL that share no token with its subject, in document order"""
+        if srl_idx not in self._clauses:
+            srl = self.srls[srl_idx]
+            subject_indices = {tok.i for tok in Helper.checkForAppropriateObjOrSub(srl, 0)}
+            sent_srl_tokens = []
+            for v in srl.values():
+                if subject_indices.isdisjoint(tok.i for tok in v):
+                    sent_srl_tokens.extend(Helper.simplify_dependencies(v))
+            self._clauses[srl_idx] = sorted(sent_srl_tokens, key=lambda x: x.idx)
+        return self._clauses[srl_idx]
     
     def _resolve_coref_within_cluster(self, tokens: List[Token]) -> List[Token]:
         resolved_tokens = []
@@ -103,56 +139,24 @@ class QConstructor:
             return outputs
         
         for tok in subject_input:
-            for idx, cluster in enumerate(self.clusters):
-                for span in cluster:
-                    if tok in span:
-                        possible_span_indices = []
-                        for idx, span in enumerate(cluster):
-                            if span[0].sent.start_char < tok.sent.start_char: # only consider the previous sentences
-                                possible_span_indices.append(idx)
-                        if len(possible_span_indices) > 0:
-                            sorted_possible_span_indices = sorted(possible_span_indices, key=lambda x: cluster[x][0].sent.start)
-                            possible_srl_indices = []
-                            # for each span, loop through the srls to extract the srl sentence such that span has enrolled in
-                            for idx in sorted_possible_span_indices:
-                                for srl_idx, srl in enumerate(self.srls):
-                                    if 'V' not in self.srls[srl_idx]:
-                                        continue
-                                    subject_tokens = Helper.checkForAppropriateObjOrSub(srl, 0)
-                                    if len(subject_tokens) > 0 and any([(tok in subject_tokens) for tok in cluster[idx]]):
-                                        if srl_idx not in possible_srl_indices:
-                                            possible_srl_indices.append(srl_idx)
-                            if len(possible_srl_indices) > 0:
-                                srl_idx = possible_srl_indices[0]
-                                sent_srl_tokens = []
-                                subject_tokens = Helper.checkForAppropriateObjOrSub(self.srls[srl_idx], 0)
-                                for k, v in self.srls[srl_idx].items():
-                                    is_token_in_subject = False
-                                    for tok_v in v:
-                                        if tok_v in subject_tokens:
-                                            is_token_in_subject = True
-                                    if not is_token_in_subject:
-                                        simplified_v = Helper.simplify_dependencies(v)
-                                        sent_srl_tokens.extend(simplified_v)
-                                sorted_sent_srl_tokens = sorted(sent_srl_tokens, key=lambda x: x.idx)
-                                srl_text = 'the one that ' + Helper.merge_tokens(sorted_sent_srl_tokens)
-                                if self.enhance_level > 1:
-                                    max_srls = min(self.enhance_level, len(possible_srl_indices) - 1)
-                                    for srl_idx in possible_srl_indices[1:max_srls]:
-                                        sent_srl_tokens = []
-                                        subject_tokens = Helper.checkForAppropriateObjOrSub(self.srls[srl_idx], 0)
-                                        for k, v in self.srls[srl_idx].items():
-                                            is_token_in_subject = False
-                                            for tok_v in v:
-                                                if tok_v in subject_tokens:
-                                                    is_token_in_subject = True
-                                                    break
-                                            if not is_token_in_subject:
-                                                simplified_v = Helper.simplify_dependencies(v)
-                                                sent_srl_tokens.extend(simplified_v)
-                                        sorted_sent_srl_tokens = sorted(sent_srl_tokens, key=lambda x: x.idx)
-                                        srl_text = srl_text + ' and ' + Helper.merge_tokens(sorted_sent_srl_tokens)
-                                outputs.append(srl_text)
+            for cluster_idx, _, _ in self._get_coref_entries(tok):
+                cluster = self.clusters[cluster_idx]
+                possible_span_indices = []
+                for idx, span in enumerate(cluster):
+                    if span[0].sent.start_char < tok.sent.start_char: # only consider the previous sentences
+                        possible_span_indices.append(idx)
+                if len(possible_span_indices) > 0:
+                    sorted_possible_span_indices = sorted(possible_span_indices, key=lambda x: cluster[x][0].sent.start)
+                    # SRLs whose subject is one of the spans, looked up in the SRL argument index of the doc
+                    possible_srl_indices = self._subject_srl_indices([cluster[idx] for idx in sorted_possible_span_indices])
+                    if len(possible_srl_indices) > 0:
+                        srl_idx = possible_srl_indices[0]
+                        srl_text = 'the one that ' + Helper.merge_tokens(self._clause_without_subject(srl_idx))
+                        if self.enhance_level > 1:
+                            max_srls = min(self.enhance_level, len(possible_srl_indices) - 1)
+                            for srl_idx in possible_srl_indices[1:max_srls]:
+                                srl_text = srl_text + ' and ' + Helper.merge_tokens(self._clause_without_subject(srl_idx))
+                        outputs.append(srl_text)
         return outputs
     
     
@@ -174,12 +178,9 @@ class QConstructor:
         if len(antecedent_of_subject_input) == 0:
             antecedent_of_subject_input = subject_input
         for tok in subject_input:
-            found_cluster_idx = -1
-            for idx, cluster in enumerate(self.clusters):
-                for span in cluster:
-                    if tok in span:
-                        found_cluster_idx = idx
-                        break
+            # last cluster that contains the token
+            coref_entries = self._get_coref_entries(tok)
+            found_cluster_idx = coref_entries[-1][0] if coref_entries else -1
             if found_cluster_idx != -1:
                 possible_span_indices = []
                 for idx, span in enumerate(self.clusters[found_cluster_idx]):
@@ -187,35 +188,14 @@ class QConstructor:
                         possible_span_indices.append(idx)
                 if len(possible_span_indices) > 0:
                     sorted_possible_span_indices = sorted(possible_span_indices, key=lambda x: self.clusters[found_cluster_idx][x][0].sent.start)
-                    possible_srl_indices = []
-                    # for each span, loop through the srls to extract the srl sentence such that span has enrolled in
-                    for idx in sorted_possible_span_indices:
-                        for srl_idx, srl in enumerate(self.srls):
-                            if 'V' not in self.srls[srl_idx]:
-                                continue
-                            subject_tokens = Helper.checkForAppropriateObjOrSub(srl, 0)
-                            if len(subject_tokens) > 0 and any([(tok in subject_tokens) for tok in self.clusters[found_cluster_idx][idx]]):
-                                if srl_idx not in possible_srl_indices:
-                                    possible_srl_indices.append(srl_idx)
-                    # Get unique srls in different sentences
-                    srl_indices = possible_srl_indices.copy()
+                    # SRLs whose subject is one of the spans, looked up in the SRL argument index of the doc
+                    srl_indices = self._subject_srl_indices([self.clusters[found_cluster_idx][idx] for idx in sorted_possible_span_indices])
                             
                     if len(srl_indices) > 0:
                         srl_text = answer_input + ', '
                         is_first_clause = True
                         for srl_idx in srl_indices[:min(self.enhance_level, len(srl_indices))]:
-                            sent_srl_tokens = []
-                            subject_tokens = Helper.checkForAppropriateObjOrSub(self.srls[srl_idx], 0)
-                            for k, v in self.srls[srl_idx].items():
-                                is_token_in_subject = False
-                                for tok_v in v:
-                                    if tok_v in subject_tokens:
-                                        is_token_in_subject = True
-                                        break
-                                if not is_token_in_subject:
-                                    simplified_v = Helper.simplify_dependencies(v)
-                                    sent_srl_tokens.extend(simplified_v)
-                            sorted_sent_srl_tokens = sorted(sent_srl_tokens, key=lambda x: x.idx)
+                            sorted_sent_srl_tokens = self._clause_without_subject(srl_idx)
                             if is_first_clause:
                                 srl_text = srl_text + 'and ' + Helper.merge_tokens(antecedent_of_subject_input) + ' ' + Helper.merge_tokens(sorted_sent_srl_tokens)
                                 is_first_clause = False
@@ -239,7 +219,7 @@ class QConstructor:
             List of tuples of new extra field and answer
         """
         outputs = []
-        for srl in self.srls:
+        for srl_idx, srl in enumerate(self.srls):
             if ('V' not in srl.keys()):
                 continue
             # Check for different sentences
@@ -272,17 +252,7 @@ class QConstructor:
                 extra_field = ''
                 answer = 'yes'
                 # Add sentence 2 to the extra_field
-                sent_srl_tokens2 = []
-                for k, v in srl.items():
-                    is_token_in_subject = False
-                    for tok_v in v:
-                        if tok_v in found_subject_tokens:
-                            is_token_in_subject = True
-                    if not is_token_in_subject:
-                        simplified_v = Helper.simplify_dependencies(v)
-                        sent_srl_tokens2.extend(simplified_v)
-                sent_srl_tokens2 = sorted(sent_srl_tokens2, key=lambda x: x.idx)
-                extra_field = Helper.merge_tokens(sent_srl_tokens2)
+                extra_field = Helper.merge_tokens(self._clause_without_subject(srl_idx))
                 extra_field = 'and ' + extra_field
                 outputs.append((extra_field, answer))
             # Check if the two subject are not in cluster, yield "no" question and correct the answer
@@ -317,251 +287,216 @@ class QConstructor:
                     outputs.append((extra_field, answer))
         return outputs
     
-    def constructQuestion(
-            self, 
-            deconstruction_results: List[QDeconstructionResult], 
-            limit: int = 100,
-            selection_method: str = 'random',
-            type_name: str = None,
-            verbose: bool = False,):
-        qa_pairs = []
-        for deconstruction_result in deconstruction_results:
-            if verbose:
-                print("===> Deconstruction result: ")
-                print(deconstruction_result)
-            predicate_text = Helper.merge_tokens(deconstruction_result.predicate)
-            
-            predicate = deconstruction_result.predicate.copy()
-            
-            negativeIndex = -1
-            numOfVerbs = 0
-            firstFoundVerbIndex = -1
-            having_word_to = False
-            having_word_and = False
-            # VB: Verb, base form
-            # VBD: Verb, past tense
-            # VBG: Verb, gerund or present participle
-            # VBN: Verb, past participle
-            # VBP: Verb, non-3rd person singular present
-            # VBZ: Verb, 3rd person singular present
-            # MD: Modal
-            # RB: Adverb
-            for idx, tok in enumerate(predicate):
-                if (tok.text == 'and'): 
-                    having_word_and = True
-                if (tok.text == 'to'):
-                    having_word_to = True
-                if (tok.tag_ in ['VB', 'VBD', 'VBG', 'VBN', 'VBP', 'VBZ', 'MD']):
-                    if (numOfVerbs == 0):
-                        firstFoundVerbIndex = idx
-                    numOfVerbs = numOfVerbs + 1
-                if (tok.tag_ == 'RB') and (tok.text.lower() == 'not'):
-                    if (numOfVerbs == 0):
-                        firstFoundVerbIndex = idx
-                    numOfVerbs = numOfVerbs + 1
-                    negativeIndex = idx
-            aux_text = ''
-            root_verb = ''
-            predArr = predicate
-            predicate_strs = Helper.merge_tokens(predArr).split()
-            negativePart = ''
+    def _construct_pairs(self, deconstruction_result: QDeconstructionResult, verbose: bool = False):
+        """Yield the QA pairs built from one deconstruction result, in the order they are built"""
+        if verbose:
+            print("===> Deconstruction result: ")
+            print(deconstruction_result)
+        # token lists of the result, resolved once from its token indices
+        predicate = deconstruction_result.predicate
+        subject = deconstruction_result.subject
+        type_text = deconstruction_result.type
+        predicate_text = Helper.merge_tokens(predicate)
+        
+        negativeIndex = -1
+        numOfVerbs = 0
+        firstFoundVerbIndex = -1
+        having_word_to = False
+        having_word_and = False
+        # VB: Verb, base form
+        # VBD: Verb, past tense
+        # VBG: Verb, gerund or present participle
+        # VBN: Verb, past participle
+        # VBP: Verb, non-3rd person singular present
+        # VBZ: Verb, 3rd person singular present
+        # MD: Modal
+        # RB: Adverb
+        for idx, tok in enumerate(predicate):
+            if (tok.text == 'and'): 
+                having_word_and = True
+            if (tok.text == 'to'):
+                having_word_to = True
+            if (tok.tag_ in ['VB', 'VBD', 'VBG', 'VBN', 'VBP', 'VBZ', 'MD']):
+                if (numOfVerbs == 0):
+                    firstFoundVerbIndex = idx
+                numOfVerbs = numOfVerbs + 1
+            if (tok.tag_ == 'RB') and (tok.text.lower() == 'not'):
+                if (numOfVerbs == 0):
+                    firstFoundVerbIndex = idx
+                numOfVerbs = numOfVerbs + 1
+                negativeIndex = idx
+        aux_text = ''
+        root_verb = ''
+        predArr = predicate
+        predicate_strs = Helper.merge_tokens(predArr).split()
+        negativePart = ''
 
-            if (not having_word_and):
-                if (negativeIndex > -1):
-                    negativePart = predArr.pop(negativeIndex).text
-                if (numOfVerbs == 1) or (having_word_to):
-                    if (predArr[0].text not in ['am', 'is', 'are', 'was', 'were']):
-                        word = predArr[firstFoundVerbIndex].text
-                        tag = predArr[firstFoundVerbIndex].tag_
-                        if (tag == 'MD'): # modal verb
-                            pass
-                        elif (tag == 'VBG'): # gerund
-                            deconstruction_result.type = ''
-                        elif (tag == 'VBZ'): # 3rd person singular present
-                            aux_text = 'does'
-                            if word == 'has':
-                                root_verb = word
-                            else:
-                                root_verb = utils.lemmatizeVerb(word)
-                        elif tag == 'VBP': # non-3rd person singular present
-                            aux_text = 'do'
+        if (not having_word_and):
+            if (negativeIndex > -1):
+                negativePart = predArr.pop(negativeIndex).text
+            if (numOfVerbs == 1) or (having_word_to):
+                if (predArr[0].text not in ['am', 'is', 'are', 'was', 'were']):
+                    word = predArr[firstFoundVerbIndex].text
+                    tag = predArr[firstFoundVerbIndex].tag_
+                    if (tag == 'MD'): # modal verb
+                        pass
+                    elif (tag == 'VBG'): # gerund
+                        type_text = ''
+                    elif (tag == 'VBZ'): # 3rd person singular present
+                        aux_text = 'does'
+                        if word == 'has':
                             root_verb = word
-                        elif tag == 'VBD' or tag == 'VBN': # past tense or past participle
-                            aux_text = 'did'
-                            root_verb = utils.lemmatizeVerb(word)
                         else:
-                            isFound = False
-                            for l, tok in enumerate(self.doc):
-                                if isFound: 
-                                    break
-                                for m in range(len(deconstruction_result.subject)):
-                                    if tok == deconstruction_result.subject[m]:
-                                        if tok.tag_ == 'NN': # singular noun
-                                            aux_text = 'does'
-                                            root_verb = word
-                                            isFound = True
-                                            break
-                                        elif tok.tag_ == 'NNS': # plural noun
-                                            aux_text = 'do'
-                                            root_verb = word
-                                            isFound = True
-                                            break
-                                    if (l == len(self.doc)-1) and (m == len(deconstruction_result.subject)-1):
+                            root_verb = utils.lemmatizeVerb(word, predArr[firstFoundVerbIndex].lemma_)
+                    elif tag == 'VBP': # non-3rd person singular present
+                        aux_text = 'do'
+                        root_verb = word
+                    elif tag == 'VBD' or tag == 'VBN': # past tense or past participle
+                        aux_text = 'did'
+                        root_verb = utils.lemmatizeVerb(word, predArr[firstFoundVerbIndex].lemma_)
+                    else:
+                        isFound = False
+                        for l, tok in enumerate(self.doc):
+                            if isFound: 
+                                break
+                            for m in range(len(subject)):
+                                if tok == subject[m]:
+                                    if tok.tag_ == 'NN': # singular noun
+                                        aux_text = 'does'
+                                        root_verb = word
+                                        isFound = True
+                                        break
+                                    elif tok.tag_ == 'NNS': # plural noun
                                         aux_text = 'do'
                                         root_verb = word
                                         isFound = True
                                         break
-                        predArr.pop(firstFoundVerbIndex)
-                        predicate_strs = [root_verb] + Helper.merge_tokens(predArr).split()
-                    elif predArr[0].text in ['am', 'is', 'are', 'was', 'were']:
-                        aux_text = predArr[0].text
-                        predArr.pop(firstFoundVerbIndex)
-                        predicate_strs = Helper.merge_tokens(predArr).split()
-                if numOfVerbs == 0 and len(predArr) == 1:
-                    mainVerb = predArr[0].text
-                    if utils.lemmatizeVerb(predArr[0].text) == predArr[0].text:
-                        aux_text = 'do'
-                    else:
-                        aux_text = 'does'
-                    predicate_strs = [mainVerb]
-                if numOfVerbs > 1: # More than 1 verb (e.g. 'He is going to school', 'He will be going to school')
-                    word = predArr[firstFoundVerbIndex].text
-                    if word in ['am', 'is', 'are', 'was', 'were', 'has', 'have', 'had', 'will']:
-                        aux_text = word
-                        predArr.pop(firstFoundVerbIndex)
-                        if not isinstance(predArr, list):
-                            predArr = list(predArr)
-                        predicate_strs = Helper.merge_tokens(predArr).split()
-            else: # having_word_and (e.g. 'He finds and eats the apple'), TODO: handle more complex cases
-                pass
-                
-            isQuestionMarkExist = False
-            verbRemainingPart = Helper.merge_strs(predicate_strs)
-            question = ''
-            type_text = deconstruction_result.type
-            # Replace by the antecedent of answer
-            resolved_answer = self._resolve_coref(deconstruction_result.key_answer.copy())
-            answer = Helper.merge_tokens(resolved_answer)
-            # Replace by the antecedent of object
-            resolved_object = self._resolve_coref(deconstruction_result.object.copy())
-            object_text = Helper.merge_tokens(resolved_object)
-            
-            # Replace by the antecedent of extra field
-            resolved_extra = self._resolve_coref(deconstruction_result.extra_field.copy())
-            extra_text = Helper.merge_tokens(resolved_extra)
-            if type_text != 'direct':
-                for subject_text in self._enhance_subject(deconstruction_result.subject):
-                    if type_text == 'dative_question':
-                        whQuestion = 'What '
-                        for ent in self.doc.ents:
-                            if (ent.text == answer and ent.label_ == 'PERSON'):
-                                whQuestion = 'Whom '
-                                break
-                        question = whQuestion + aux_text + ' ' + subject_text + ' ' + negativePart + ' ' + verbRemainingPart + ' ' + object_text + ' ' + extra_text
-                    elif type_text == 'dobj_question' or type_text == 'pcomp_question':
-                        whQuestion = 'What '
-                        for ent in self.doc.ents:
-                            if (ent.text == object_text and ent.label_ == 'PERSON'):
-                                whQuestion = 'Who '
-                                break
-                        question = whQuestion + aux_text + ' ' + negativePart + ' ' + subject_text + ' ' + verbRemainingPart  + ' ' + extra_text
-                    elif type_text == 'acomp_question':
-                        isQuestionMarkExist = True  
-                        question = 'Indicate characteristics of ' + utils.getObjectPronun(subject_text)
-                    elif type_text == 'nsubj_question':
-                        question_word = 'What '
-                        for ent in self.doc.ents:
-                            if (ent.text == answer and ent.label_ == 'PERSON'):
-                                question_word = 'Who '
-                        question = question_word + predicate_text + ' ' + object_text + ' ' + extra_text
-                    elif type_text == 'srl_causal':
-                        question = 'Why '+ aux_text + ' ' + negativePart + ' ' + subject_text + ' ' + verbRemainingPart + ' ' + object_text  + ' ' + extra_text
-                    elif type_text == 'srl_purpose':
-                        question = 'What '+ aux_text + negativePart + ' the purpose of that ' + subject_text + ' ' + verbRemainingPart + ' ' + object_text  + ' ' + extra_text
-                    elif type_text == 'srl_manner':
-                        question = 'How '+ aux_text + ' ' + negativePart + ' ' + subject_text + ' ' + verbRemainingPart + ' ' + object_text  + ' ' + extra_text
-                    elif type_text == 'srl_temporal':
-                        # defind question word based on the answer (three types: when, how long, how often)
-                        question_word = 'When '
-                        if 'for' in answer or 'since' in answer:
-                            question_word = 'How long '
-                        elif 'every' in answer or 'each' in answer:
-                            question_word = 'How often '
-                        question = 'When '+ aux_text + ' ' + negativePart + ' ' + subject_text + ' ' + verbRemainingPart + ' ' + object_text  + ' ' + extra_text
-                    elif type_text == 'srl_locative':
-                        question = 'Where '+aux_text + ' ' + negativePart + ' ' + subject_text + ' ' + verbRemainingPart + ' ' + object_text  + ' ' + extra_text
-                    elif type_text == 'ner_date_question':
-                        question = 'When '+ aux_text + ' ' + negativePart + ' ' + subject_text + ' ' + verbRemainingPart + ' ' + object_text  + ' ' + extra_text
-                    elif type_text == 'ner_loc_question':
-                        question = 'Where '+aux_text + ' ' + negativePart + ' ' + subject_text + ' ' + verbRemainingPart + ' ' + object_text  + ' ' + extra_text
-                    elif type_text == 'ner_cardinal_question':
-                        question = 'How many ' + subject_text + ' ' + aux_text + ' ' + negativePart + ' ' + extra_text  + ' ' + verbRemainingPart + ' ' + object_text
-                    elif type_text == 'ner_person_question':
-                        if object_text.endswith('.'):
-                            object_text = object_text[:-1]
-                        question = 'Who ' + aux_text + ' ' + negativePart + ' ' + verbRemainingPart + ' ' + object_text + ' ' + extra_text
+                                if (l == len(self.doc)-1) and (m == len(subject)-1):
+                                    aux_text = 'do'
+                                    root_verb = word
+                                    isFound = True
+                                    break
+                    predArr.pop(firstFoundVerbIndex)
+                    predicate_strs = [root_verb] + Helper.merge_tokens(predArr).split()
+                elif predArr[0].text in ['am', 'is', 'are', 'was', 'were']:
+                    aux_text = predArr[0].text
+                    predArr.pop(firstFoundVerbIndex)
+                    predicate_strs = Helper.merge_tokens(predArr).split()
+            if numOfVerbs == 0 and len(predArr) == 1:
+                mainVerb = predArr[0].text
+                if utils.lemmatizeVerb(predArr[0].text, predArr[0].lemma_) == predArr[0].text:
+                    aux_text = 'do'
+                else:
+                    aux_text = 'does'
+                predicate_strs = [mainVerb]
+            if numOfVerbs > 1: # More than 1 verb (e.g. 'He is going to school', 'He will be going to school')
+                word = predArr[firstFoundVerbIndex].text
+                if word in ['am', 'is', 'are', 'was', 'were', 'has', 'have', 'had', 'will']:
+                    aux_text = word
+                    predArr.pop(firstFoundVerbIndex)
+                    if not isinstance(predArr, list):
+                        predArr = list(predArr)
+                    predicate_strs = Helper.merge_tokens(predArr).split()
+        else: # having_word_and (e.g. 'He finds and eats the apple'), TODO: handle more complex cases
+            pass
             
-                    words = question.split()
-                    formattedQuestion = ''
-                    for word_idx, word in enumerate(words):
-                        if word in ['He', 'She', 'It', 'They', 'We', 'In'] and word_idx != 0:
-                            word = word.lower()
-                        if word in ['.', ',', '?', '!', ':', ';'] or word == "'s":
-                            formattedQuestion = formattedQuestion + word
-                        else:
-                            formattedQuestion = formattedQuestion + ' ' + word
-
-                    if formattedQuestion != '':
-                        if isQuestionMarkExist == False:
-                            formattedQuestion = formattedQuestion + '?'
-                        else: 
-                            formattedQuestion = formattedQuestion + '.'
-                        if verbose:
-                            print('\tGenerate final question: ', formattedQuestion)
-                        qa_pairs.append({
-                            'question': formattedQuestion,
-                            'answer': answer,
-                            'type': type_text,
-                        })
-            else: # type_text == 'direct':
-                # Enhance the question by adding multiple SRLs
-                extra_fields = self._enhance_direct_question_by_multiple_srls(deconstruction_result.subject)
-                for extra_field, answer in extra_fields:
-                    aux_text = aux_text[:1].upper() + aux_text[1:]
+        isQuestionMarkExist = False
+        verbRemainingPart = Helper.merge_strs(predicate_strs)
+        question = ''
+        # Replace by the antecedent of answer
+        resolved_answer = self._resolve_coref(deconstruction_result.key_answer)
+        answer = Helper.merge_tokens(resolved_answer)
+        # Replace by the antecedent of object
+        resolved_object = self._resolve_coref(deconstruction_result.object)
+        object_text = Helper.merge_tokens(resolved_object)
+        
+        # Replace by the antecedent of extra field
+        resolved_extra = self._resolve_coref(deconstruction_result.extra_field)
+        extra_text = Helper.merge_tokens(resolved_extra)
+        if type_text != 'direct':
+            for subject_text in self._enhance_subject(subject):
+                if type_text == 'dative_question':
+                    whQuestion = 'What '
+                    for ent in self.doc.ents:
+                        if (ent.text == answer and ent.label_ == 'PERSON'):
+                            whQuestion = 'Whom '
+                            break
+                    question = whQuestion + aux_text + ' ' + subject_text + ' ' + negativePart + ' ' + verbRemainingPart + ' ' + object_text + ' ' + extra_text
+                elif type_text == 'dobj_question' or type_text == 'pcomp_question':
+                    whQuestion = 'What '
+                    for ent in self.doc.ents:
+                        if (ent.text == object_text and ent.label_ == 'PERSON'):
+                            whQuestion = 'Who '
+                            break
+                    question = whQuestion + aux_text + ' ' + negativePart + ' ' + subject_text + ' ' + verbRemainingPart  + ' ' + extra_text
+                elif type_text == 'acomp_question':
+                    isQuestionMarkExist = True  
+                    question = 'Indicate characteristics of ' + utils.getObjectPronun(subject_text)
+                elif type_text == 'nsubj_question':
+                    question_word = 'What '
+                    for ent in self.doc.ents:
+                        if (ent.text == answer and ent.label_ == 'PERSON'):
+                            question_word = 'Who '
+                    question = question_word + predicate_text + ' ' + object_text + ' ' + extra_text
+                elif type_text == 'srl_causal':
+                    question = 'Why '+ aux_text + ' ' + negativePart + ' ' + subject_text + ' ' + verbRemainingPart + ' ' + object_text  + ' ' + extra_text
+                elif type_text == 'srl_purpose':
+                    question = 'What '+ aux_text + negativePart + ' the purpose of that ' + subject_text + ' ' + verbRemainingPart + ' ' + object_text  + ' ' + extra_text
+                elif type_text == 'srl_manner':
+                    question = 'How '+ aux_text + ' ' + negativePart + ' ' + subject_text + ' ' + verbRemainingPart + ' ' + object_text  + ' ' + extra_text
+                elif type_text == 'srl_temporal':
+                    # defind question word based on the answer (three types: when, how long, how often)
+                    question_word = 'When '
+                    if 'for' in answer or 'since' in answer:
+                        question_word = 'How long '
+                    elif 'every' in answer or 'each' in answer:
+                        question_word = 'How often '
+                    question = 'When '+ aux_text + ' ' + negativePart + ' ' + subject_text + ' ' + verbRemainingPart + ' ' + object_text  + ' ' + extra_text
+                elif type_text == 'srl_locative':
+                    question = 'Where '+aux_text + ' ' + negativePart + ' ' + subject_text + ' ' + verbRemainingPart + ' ' + object_text  + ' ' + extra_text
+                elif type_text == 'ner_date_question':
+                    question = 'When '+ aux_text + ' ' + negativePart + ' ' + subject_text + ' ' + verbRemainingPart + ' ' + object_text  + ' ' + extra_text
+                elif type_text == 'ner_loc_question':
+                    question = 'Where '+aux_text + ' ' + negativePart + ' ' + subject_text + ' ' + verbRemainingPart + ' ' + object_text  + ' ' + extra_text
+                elif type_text == 'ner_cardinal_question':
+                    question = 'How many ' + subject_text + ' ' + aux_text + ' ' + negativePart + ' ' + extra_text  + ' ' + verbRemainingPart + ' ' + object_text
+                elif type_text == 'ner_person_question':
                     if object_text.endswith('.'):
                         object_text = object_text[:-1]
-                    resolved_subject = self._resolve_coref(deconstruction_result.subject.copy())
-                    subject_text = Helper.merge_tokens(resolved_subject)
-                    question = aux_text + ' ' + subject_text + ' ' + verbRemainingPart + ' ' + object_text  + ' ' + extra_text + ' ' + extra_field
-                    words = question.split()
-                    formattedQuestion = ''
-                    for word_idx, word in enumerate(words):
-                        if word in ['He', 'She', 'It', 'They', 'We', 'In'] and word_idx != 0:
-                            word = word.lower()
-                        if word in ['.', ',', '?', '!', ':', ';'] or word == "'s":
-                            formattedQuestion = formattedQuestion + word
-                        else:
-                            formattedQuestion = formattedQuestion + ' ' + word
-                    if formattedQuestion != '':
-                        if isQuestionMarkExist == False:
-                            formattedQuestion = formattedQuestion + '?'
-                        else: 
-                            formattedQuestion = formattedQuestion + '.'
-                        if verbose:
-                            print('\tGenerate final question: ', formattedQuestion)
-                        qa_pairs.append({
-                            'question': formattedQuestion,
-                            'answer': answer,
-                            'type': 'direct_with_multiple_srls',
-                        })
-                aux_text= aux_text[:1].upper() + aux_text[1:]
+                    question = 'Who ' + aux_text + ' ' + negativePart + ' ' + verbRemainingPart + ' ' + object_text + ' ' + extra_text
+        
+                words = question.split()
+                formattedQuestion = ''
+                for word_idx, word in enumerate(words):
+                    if word in ['He', 'She', 'It', 'They', 'We', 'In'] and word_idx != 0:
+                        word = word.lower()
+                    if word in ['.', ',', '?', '!', ':', ';'] or word == "'s":
+                        formattedQuestion = formattedQuestion + word
+                    else:
+                        formattedQuestion = formattedQuestion + ' ' + word
+
+                if formattedQuestion != '':
+                    if isQuestionMarkExist == False:
+                        formattedQuestion = formattedQuestion + '?'
+                    else: 
+                        formattedQuestion = formattedQuestion + '.'
+                    if verbose:
+                        print('\tGenerate final question: ', formattedQuestion)
+                    yield {
+                        'question': formattedQuestion,
+                        'answer': answer,
+                        'type': type_text,
+                    }
+        else: # type_text == 'direct':
+            # Enhance the question by adding multiple SRLs
+            extra_fields = self._enhance_direct_question_by_multiple_srls(subject)
+            for extra_field, answer in extra_fields:
+                aux_text = aux_text[:1].upper() + aux_text[1:]
                 if object_text.endswith('.'):
                     object_text = object_text[:-1]
-                resolved_subject = self._resolve_coref(deconstruction_result.subject.copy())
+                resolved_subject = self._resolve_coref(subject.copy())
                 subject_text = Helper.merge_tokens(resolved_subject)
-                question = aux_text + ' ' + subject_text + ' ' + verbRemainingPart + ' ' + object_text  + ' ' + extra_text
-                answer = 'Yes' if not negativePart else 'No'
-                answers = self._enhance_answer_in_direct_question(deconstruction_result.subject, answer)
+                question = aux_text + ' ' + subject_text + ' ' + verbRemainingPart + ' ' + object_text  + ' ' + extra_text + ' ' + extra_field
                 words = question.split()
                 formattedQuestion = ''
                 for word_idx, word in enumerate(words):
@@ -571,21 +506,37 @@ class QConstructor:
                         formattedQuestion = formattedQuestion + word
                     else:
                         formattedQuestion = formattedQuestion + ' ' + word
-                if answers:
-                    for ans in answers:
-                        if formattedQuestion != '':
-                            if isQuestionMarkExist == False:
-                                formattedQuestion = formattedQuestion + '?'
-                            else: 
-                                formattedQuestion = formattedQuestion + '.'
-                            if verbose:
-                                print('\tGenerate final question: ', formattedQuestion)
-                            qa_pairs.append({
-                                'question': formattedQuestion,
-                                'answer': ans,
-                                'type': type_text,
-                            })
+                if formattedQuestion != '':
+                    if isQuestionMarkExist == False:
+                        formattedQuestion = formattedQuestion + '?'
+                    else: 
+                        formattedQuestion = formattedQuestion + '.'
+                    if verbose:
+                        print('\tGenerate final question: ', formattedQuestion)
+                    yield {
+                        'question': formattedQuestion,
+                        'answer': answer,
+                        'type': 'direct_with_multiple_srls',
+                    }
+            aux_text= aux_text[:1].upper() + aux_text[1:]
+            if object_text.endswith('.'):
+                object_text = object_text[:-1]
+            resolved_subject = self._resolve_coref(subject.copy())
+            subject_text = Helper.merge_tokens(resolved_subject)
+            question = aux_text + ' ' + subject_text + ' ' + verbRemainingPart + ' ' + object_text  + ' ' + extra_text
+            answer = 'Yes' if not negativePart else 'No'
+            answers = self._enhance_answer_in_direct_question(subject, answer)
+            words = question.split()
+            formattedQuestion = ''
+            for word_idx, word in enumerate(words):
+                if word in ['He', 'She', 'It', 'They', 'We', 'In'] and word_idx != 0:
+                    word = word.lower()
+                if word in ['.', ',', '?', '!', ':', ';'] or word == "'s":
+                    formattedQuestion = formattedQuestion + word
                 else:
+                    formattedQuestion = formattedQuestion + ' ' + word
+            if answers:
+                for ans in answers:
                     if formattedQuestion != '':
                         if isQuestionMarkExist == False:
                             formattedQuestion = formattedQuestion + '?'
@@ -593,53 +544,77 @@ class QConstructor:
                             formattedQuestion = formattedQuestion + '.'
                         if verbose:
                             print('\tGenerate final question: ', formattedQuestion)
-                        qa_pairs.append({
+                        yield {
                             'question': formattedQuestion,
-                            'answer': answer,
+                            'answer': ans,
                             'type': type_text,
-                        })
+                        }
+            else:
+                if formattedQuestion != '':
+                    if isQuestionMarkExist == False:
+                        formattedQuestion = formattedQuestion + '?'
+                    else: 
+                        formattedQuestion = formattedQuestion + '.'
+                    if verbose:
+                        print('\tGenerate final question: ', formattedQuestion)
+                    yield {
+                        'question': formattedQuestion,
+                        'answer': answer,
+                        'type': type_text,
+                    }
 
-        # Remove duplicates
-        unique_questions = []
-        unique_answers = []
-        unique_qa_pairs = []
-        for i in range(len(qa_pairs)):
-            if (qa_pairs[i]['question'] not in unique_questions) or (qa_pairs[i]['answer'] not in unique_answers):
-                unique_questions.append(qa_pairs[i]['question'])
-                unique_answers.append(qa_pairs[i]['answer'])
-                unique_qa_pairs.append(qa_pairs[i])
+    def iterQuestions(
+            self, 
+            deconstruction_results: List[QDeconstructionResult], 
+            limit: int = 100,
+            selection_method: str = 'random',
+            type_name: str = None,
+            verbose: bool = False,):
+        """
+        Yield unique QA pairs of the deconstruction results, at most `limit` of them (all of them when `limit` <= 0).
+        A pair is a duplicate when both its question and its answer were already yielded (not necessarily together).
+
+        With selection_method 'random' the deconstruction results are shuffled up front and the pairs are yielded
+        as they are built, so that no pair is built after the limit is reached. The other methods order or filter
+        all the pairs, so they are only yielded once every pair is built.
+        """
+        if selection_method not in SELECTION_METHODS:
+            raise ValueError('Invalid selection method')
+        if selection_method == 'only_type' and type_name is None:
+            raise ValueError('Type name is not specified')
+
+        def unique_pairs(results):
+            seen_questions = set()
+            seen_answers = set()
+            for deconstruction_result in results:
+                for qa_pair in self._construct_pairs(deconstruction_result, verbose):
+                    if (qa_pair['question'] not in seen_questions) or (qa_pair['answer'] not in seen_answers):
+                        seen_questions.add(qa_pair['question'])
+                        seen_answers.add(qa_pair['answer'])
+                        yield qa_pair
 
-        unique_qa_pairs.sort(key = lambda s: len(s['question']), reverse=True)
         if selection_method == 'random':
-            import random
-            random.shuffle(unique_qa_pairs)
-        elif selection_method == 'only_type':
-            if 'type_name' not in locals():
-                raise ValueError('Type name is not specified')
-            unique_qa_pairs = [qa_pair for qa_pair in unique_qa_pairs if qa_pair['type'].startswith(type_name)]
-        elif selection_method == 'longest':
-            unique_qa_pairs.sort(key = lambda s: len(s['question']), reverse=True)
-        elif selection_method == 'shortest':
-            unique_qa_pairs.sort(key = lambda s: len(s['question']), reverse=False)
-        elif selection_method == 'alphabetical':
-            unique_qa_pairs.sort(key = lambda s: s['question'])
-        elif selection_method == 'reverse_alphabetical':
-            unique_qa_pairs.sort(key = lambda s: s['question'], reverse=True)
-        elif selection_method == 'answer_length':
-            unique_qa_pairs.sort(key = lambda s: len(s['answer']))
-        elif selection_method == 'reverse_answer_length':
-            unique_qa_pairs.sort(key = lambda s: len(s['answer']), reverse=True)
+            results = list(deconstruction_results)
+            random.shuffle(results)
+            qa_pairs = unique_pairs(results)
         else:
-            raise ValueError('Invalid selection method')
-        
-        if limit > 0:
-            unique_qa_pairs = unique_qa_pairs[:limit]
+            qa_pairs = sorted(unique_pairs(deconstruction_results), key = lambda s: len(s['question']), reverse=True)
+            if selection_method == 'only_type':
+                qa_pairs = [qa_pair for qa_pair in qa_pairs if qa_pair['type'].startswith(type_name)]
+            else:
+                key, reverse = SELECTION_METHODS[selection_method]
+                qa_pairs.sort(key = key, reverse=reverse)
+        yield from (qa_pairs if limit <= 0 else islice(qa_pairs, limit))
 
-        result = []
-        for qa_pair in tqdm(unique_qa_pairs, total=len(unique_qa_pairs), desc='Paraphrasing QA pairs'):
-            result.append({
-                'question': qa_pair['question'],
-                'answer': qa_pair['answer'],
-                'type': qa_pair['type'],
-            })        
-        return result
\ No newline at end of file
+    def constructQuestion(
+            self, 
+            deconstruction_results: List[QDeconstructionResult], 
+            limit: int = 100,
+            selection_method: str = 'random',
+            type_name: str = None,
+            verbose: bool = False,):
+        return list(self.iterQuestions(deconstruction_results, 
+                                       limit=limit, 
+                                       selection_method=selection_method, 
+                                       type_name=type_name, 
+                                       verbose=verbose,))
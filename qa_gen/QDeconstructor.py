@@ -1,28 +1,96 @@
+import struct
+from array import array
 from typing import List, Tuple
 
 import spacy
 import spacy.tokenizer
 import spacy.tokens
 from spacy.tokens import Token
+from doc_index import DocIndex
 from helper import Helper
 
 
 class QDeconstructionResult:
+    """
+    Parts of a question found by QDeconstructor. Every part is stored as an array of token indices of the doc it
+    was found in, so a result takes a few bytes per token and can be serialized without the doc (see `to_bytes`).
+    The parts are read as token lists, which requires the result to be bound to its doc (see `bind`).
+    """
+    __slots__ = ('doc', 'type', '_predicate', '_subject', '_object', '_extra_field', '_key_answer')
+    PARTS = ('predicate', 'subject', 'object', 'extra_field', 'key_answer')
+
     def __init__(
             self, 
-            predicate: List[Token] = [], 
-            subject: List[Token] = [], 
-            object: List[Token] = [], 
-            extra_field: List[Token] = [], 
+            predicate: List[Token] = None, 
+            subject: List[Token] = None, 
+            object: List[Token] = None, 
+            extra_field: List[Token] = None, 
             type='', 
-            key_answer: List[Token] = [], 
+            key_answer: List[Token] = None, 
+            doc: spacy.tokens.Doc = None,
         ):
-        self.predicate = predicate
-        self.subject = subject
-        self.object = object
-        self.extra_field = extra_field
+        self.doc = doc
         self.type = type
-        self.key_answer = key_answer
+        self.predicate = predicate or []
+        self.subject = subject or []
+        self.object = object or []
+        self.extra_field = extra_field or []
+        self.key_answer = key_answer or []
+
+    def _set_tokens(self, part: str, tokens: List[Token]):
+        if tokens and self.doc is None:
+            self.doc = tokens[0].doc
+        setattr(self, '_' + part, array('i', [token.i for token in tokens]))
+
+    def _get_tokens(self, part: str) -> List[Token]:
+        indices = getattr(self, '_' + part)
+        if indices and self.doc is None:
+            raise ValueError('QDeconstructionResult is not bound to a doc')
+        return [self.doc[i] for i in indices]
+
+    predicate = property(lambda self: self._get_tokens('predicate'), lambda self, tokens: self._set_tokens('predicate', tokens))
+    subject = property(lambda self: self._get_tokens('subject'), lambda self, tokens: self._set_tokens('subject', tokens))
+    object = property(lambda self: self._get_tokens('object'), lambda self, tokens: self._set_tokens('object', tokens))
+    extra_field = property(lambda self: self._get_tokens('extra_field'), lambda self, tokens: self._set_tokens('extra_field', tokens))
+    key_answer = property(lambda self: self._get_tokens('key_answer'), lambda self, tokens: self._set_tokens('key_answer', tokens))
+
+    def bind(self, doc: spacy.tokens.Doc) -> 'QDeconstructionResult':
+        """Resolve the token indices of the result in `doc`, the doc it was found in or the same doc restored from a cache"""
+        self.doc = doc
+        return self
+
+    def remap(self, mapping) -> 'QDeconstructionResult':
+        """Unbound copy of the result where every token index i is replaced by mapping(i)"""
+        result = QDeconstructionResult(type=self.type)
+        for part in self.PARTS:
+            setattr(result, '_' + part, array('i', [mapping(i) for i in getattr(self, '_' + part)]))
+        return result
+
+    def to_bytes(self) -> bytes:
+        """Type and token indices of the result: the UTF-8 type and every part as int32 little endian, each prefixed by its length"""
+        type_bytes = self.type.encode('utf-8')
+        chunks = [struct.pack('<I', len(type_bytes)), type_bytes]
+        for part in self.PARTS:
+            indices = getattr(self, '_' + part)
+            chunks.append(struct.pack(f'<I{len(indices)}i', len(indices), *indices))
+        return b''.join(chunks)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, doc: spacy.tokens.Doc = None) -> 'QDeconstructionResult':
+        """Result serialized by `to_bytes`, bound to `doc` if given"""
+        result = cls(doc=doc)
+        (length,) = struct.unpack_from('<I', data, 0)
+        result.type = data[4:4 + length].decode('utf-8')
+        offset = 4 + length
+        for part in cls.PARTS:
+            (length,) = struct.unpack_from('<I', data, offset)
+            setattr(result, '_' + part, array('i', struct.unpack_from(f'<{length}i', data, offset + 4)))
+            offset += 4 + 4 * length
+        return result
+
+    def __reduce__(self):
+        # pickle the indices only, the doc is bound again on the other side
+        return (QDeconstructionResult.from_bytes, (self.to_bytes(),))
 
     def __str__(self) -> str:
         predicate_text = Helper.merge_tokens(self.predicate)
@@ -35,9 +103,9 @@ class QDeconstructionResult:
 
 class QDeconstructor:
 
-    def __init__(self, doc: spacy.tokens.Doc, idx_srls: List[dict], verbose=False):
-        self.doc = doc
-        self.idx_srls = idx_srls
+    def __init__(self, doc_index: DocIndex, verbose=False):
+        self.doc_index = doc_index
+        self.doc = doc_index.doc
         self._prepare_data(verbose)
     
     def _prepare_data(self, verbose=False):
@@ -45,10 +113,7 @@ class QDeconstructor:
         for ent in self.doc.ents:
             if verbose:
                 print(ent.text, ":", ent.label_)
-            ner_tokens = []
-            for token in self.doc:
-                if ent.start_char <= token.idx < ent.end_char:
-                    ner_tokens.append(token)
+            ner_tokens = self.doc_index.tokens_in(ent.start_char, ent.end_char)
             ner_label = ''
             if (ent.label_ == 'DATE' and ent.text.find('year old') == -1 and ent.text.find('years old') == -1 ):
                 ner_label = 'DATE'
@@ -64,26 +129,13 @@ class QDeconstructor:
                     'tokens': ner_tokens
                 })
 
-        self.srls = []
-        for srl in self.idx_srls:
-            mod_srl = {}
-            for k, v in srl.items():
-                span = []
-                for token in self.doc:
-                    if v[0] <= token.idx < v[1]:
-                        span.append(token)
-                mod_srl[k] = span
-            self.srls.append(mod_srl)     
+        self.srls = self.doc_index.srls
             
         self.noun_phrases = []
         for noun_phrase in self.doc.noun_chunks:
             if verbose:
                 print(noun_phrase.text)
-            span = []
-            for token in self.doc:
-                if noun_phrase.start_char <= token.idx < noun_phrase.end_char:
-                    span.append(token)
-            self.noun_phrases.append(span)
+            self.noun_phrases.append(self.doc_index.tokens_in(noun_phrase.start_char, noun_phrase.end_char))
             
     
     def deconstruct(self):
@@ -103,168 +155,189 @@ class QDeconstructor:
         
         # Dependency parsing rules
         for word in self.doc:
-            if word.dep_ == 'dobj':
-                deconstruction_result.extend(self._deconstruct_dobj(word))
-            elif word.dep_ == 'dative':
-                deconstruction_result.extend(self._deconstruct_dative(word))
-            elif word.dep_ == 'pcomp':
-                deconstruction_result.extend(self._deconstruct_pcomp(word))
-            elif word.dep_ == 'nsubj' or word.dep_ == 'nsubjpass':
-                deconstruction_result.extend(self._deconstruct_nsubj(word))
+            deconstruction_result.extend(self._deconstruct_word(word))
         
         # Named entity recognition rules
         for ner in self.ners:
-            if ner['label'] == 'DATE':
-                deconstruction_result.extend(self._deconstruct_ner_date(ner))
-            elif ner['label'] == 'LOC':
-                deconstruction_result.extend(self._deconstruct_ner_loc(ner))
-            elif ner['label'] == 'CARDINAL':
-                deconstruction_result.extend(self._deconstruct_ner_cardinal(ner))
-            elif ner['label'] == 'PERSON':
-                deconstruction_result.extend(self._deconstruct_ner_person(ner))
+            deconstruction_result.extend(self._deconstruct_ner(ner))
 
         # Semantic role labeling rules
         for srl in self.srls:
-            if ('V' not in srl.keys()):
-                continue
-            
-            found_subject_tokens = Helper.checkForAppropriateObjOrSub(srl, 0)
-            found_object_tokens = Helper.checkForAppropriateObjOrSub(srl, 1)
+            deconstruction_result.extend(self._deconstruct_srl(srl))
+       
+        return deconstruction_result
+    
+    
+    def _deconstruct_srl(self, srl: dict) -> List[QDeconstructionResult]:
+        """Deconstructs the arguments of a predicate (direct, causal, purpose, manner, temporal and locative questions)"""
+        
+        deconstruction_result : List[QDeconstructionResult] = []
+        if ('V' not in srl.keys()):
+            return deconstruction_result
+        
+        found_subject_tokens = Helper.checkForAppropriateObjOrSub(srl, 0)
+        found_object_tokens = Helper.checkForAppropriateObjOrSub(srl, 1)
+        
+        found_subject_text = Helper.merge_tokens(found_subject_tokens)
+        found_object_text = Helper.merge_tokens(found_object_tokens)
             
-            found_subject_text = Helper.merge_tokens(found_subject_tokens)
-            found_object_text = Helper.merge_tokens(found_object_tokens)
-                
-            is_passive = False
-            if len(srl['V']) == 1:
-                full_predicate = Helper.find_full_predicate(srl['V'][0])
-                for child in srl['V'][0].children:
-                    if child.dep_ == 'auxpass':
-                        is_passive = True
-                        break
+        is_passive = False
+        full_predicate = srl['V']
+        if len(srl['V']) == 1:
+            full_predicate = Helper.find_full_predicate(srl['V'][0])
+            for child in srl['V'][0].children:
+                if child.dep_ == 'auxpass':
+                    is_passive = True
+                    break
+        else:
+            for pred_token in srl['V']:
+                if pred_token.tag_.startswith('VB'):
+                    for child in pred_token.children:
+                        if child.dep_ == 'auxpass':
+                            is_passive = True
+                            break
+                    full_predicate = Helper.find_full_predicate(pred_token)
+                    
+        full_predicate_text = Helper.merge_tokens(full_predicate)
+        
+        if found_subject_text and found_object_text and found_subject_text != found_object_text:
+            # Direct question
+            current_result = QDeconstructionResult()
+            current_result.predicate = full_predicate
+            extra_tokens = []
+            if is_passive and 'ARG0' in srl.keys() and 'ARG1' in srl.keys():
+                current_result.subject = found_object_tokens
+                current_result.object = found_subject_tokens
             else:
-                for pred_token in srl['V']:
-                    if pred_token.tag_.startswith('VB'):
-                        for child in pred_token.children:
-                            if child.dep_ == 'auxpass':
-                                is_passive = True
-                                break
-                        full_predicate = Helper.find_full_predicate(pred_token)
-                        
-            full_predicate_text = Helper.merge_tokens(full_predicate)
-            
-            if found_subject_text and found_object_text and found_subject_text != found_object_text:
-                # Direct question
+                current_result.object = found_object_tokens
+                current_result.subject = found_subject_tokens
+                # In case of object is ARG2, ARG3, ARG4, we add them to the extra_field instead of object
+                if 'ARG1' not in srl.keys():
+                    current_result.object = []
+                    extra_tokens.extend(found_object_tokens)
+
+            if ('ARGM-LOC' in srl.keys()) and (Helper.merge_tokens(srl['ARGM-LOC']) not in full_predicate_text):
+                extra_tokens.extend(srl['ARGM-LOC'])
+            if ('ARGM-TMP' in srl.keys()) and (Helper.merge_tokens(srl['ARGM-TMP']) not in full_predicate_text):
+                extra_tokens.extend(srl['ARGM-TMP']) 
+            current_result.extra_field = extra_tokens
+            current_result.type = 'direct'
+            deconstruction_result.append(current_result)
+
+        if found_subject_text and found_subject_text != found_object_text:
+            # Causal question
+            if 'ARGM-CAU' in srl.keys():
                 current_result = QDeconstructionResult()
                 current_result.predicate = full_predicate
+                current_result.object = found_object_tokens
+                current_result.subject = found_subject_tokens
                 extra_tokens = []
-                if is_passive and 'ARG0' in srl.keys() and 'ARG1' in srl.keys():
-                    current_result.subject = found_object_tokens
-                    current_result.object = found_subject_tokens
-                else:
-                    current_result.object = found_object_tokens
-                    current_result.subject = found_subject_tokens
-                    # In case of object is ARG2, ARG3, ARG4, we add them to the extra_field instead of object
-                    if 'ARG1' not in srl.keys():
-                        current_result.object = []
-                        extra_tokens.extend(found_object_tokens)
-
                 if ('ARGM-LOC' in srl.keys()) and (Helper.merge_tokens(srl['ARGM-LOC']) not in full_predicate_text):
                     extra_tokens.extend(srl['ARGM-LOC'])
                 if ('ARGM-TMP' in srl.keys()) and (Helper.merge_tokens(srl['ARGM-TMP']) not in full_predicate_text):
                     extra_tokens.extend(srl['ARGM-TMP']) 
                 current_result.extra_field = extra_tokens
-                current_result.type = 'direct'
+                current_result.type = 'srl_causal'
+                current_result.key_answer = srl['ARGM-CAU']
                 deconstruction_result.append(current_result)
 
-            if found_subject_text and found_subject_text != found_object_text:
-                # Causal question
-                if 'ARGM-CAU' in srl.keys():
-                    current_result = QDeconstructionResult()
-                    current_result.predicate = full_predicate
-                    current_result.object = found_object_tokens
-                    current_result.subject = found_subject_tokens
-                    extra_tokens = []
-                    if ('ARGM-LOC' in srl.keys()) and (Helper.merge_tokens(srl['ARGM-LOC']) not in full_predicate_text):
-                        extra_tokens.extend(srl['ARGM-LOC'])
-                    if ('ARGM-TMP' in srl.keys()) and (Helper.merge_tokens(srl['ARGM-TMP']) not in full_predicate_text):
-                        extra_tokens.extend(srl['ARGM-TMP']) 
-                    current_result.extra_field = extra_tokens
-                    current_result.type = 'srl_causal'
-                    current_result.key_answer = srl['ARGM-CAU']
-                    deconstruction_result.append(current_result)
-
-            if found_subject_text and found_subject_text != found_object_text:
-                # Purpose question
-                if 'ARGM-PNC' in srl.keys() or 'ARGM-PRP' in srl.keys():
-                    current_result = QDeconstructionResult()
-                    current_result.predicate = full_predicate
-                    current_result.object = found_object_tokens
-                    current_result.subject = found_subject_tokens
-                    extra_tokens = []
-                    if ('ARGM-LOC' in srl.keys()) and (Helper.merge_tokens(srl['ARGM-LOC']) not in full_predicate_text):
-                        extra_tokens.extend(srl['ARGM-LOC'])
-                    if ('ARGM-TMP' in srl.keys()) and (Helper.merge_tokens(srl['ARGM-TMP']) not in full_predicate_text):
-                        extra_tokens.extend(srl['ARGM-TMP']) 
-                    current_result.extra_field = extra_tokens
-                    current_result.type = 'srl_purpose'
-                    if 'ARGM-PNC' in srl.keys():
-                        current_result.key_answer = srl['ARGM-PNC']
-                    elif 'ARGM-PRP' in srl.keys():
-                        current_result.key_answer = srl['ARGM-PRP']
-                    else:
-                        current_result.key_answer = []
-                    deconstruction_result.append(current_result)
-            
-            if found_subject_text and found_subject_text != found_object_text:  
-                # Manner question
-                if 'ARGM-MNR' in srl:
-                    current_result = QDeconstructionResult()
-                    current_result.predicate = full_predicate
-                    current_result.object = found_object_tokens
-                    current_result.subject = found_subject_tokens
-                    extra_tokens = []
-                    if ('ARGM-LOC' in srl.keys()) and (Helper.merge_tokens(srl['ARGM-LOC']) not in full_predicate_text):
-                        extra_tokens.extend(srl['ARGM-LOC'])
-                    if ('ARGM-TMP' in srl.keys()) and (Helper.merge_tokens(srl['ARGM-TMP']) not in full_predicate_text):
-                        extra_tokens.extend(srl['ARGM-TMP']) 
-                    current_result.extra_field = extra_tokens
-                    current_result.type = 'srl_manner'
-                    current_result.key_answer = srl['ARGM-MNR']
-                    deconstruction_result.append(current_result)
-                    
-            if found_subject_text and found_subject_text != found_object_text:     
-                # Temporal question
-                if 'ARGM-TMP' in srl:
-                    current_result = QDeconstructionResult()
-                    current_result.predicate = full_predicate
-                    current_result.object = found_object_tokens
-                    current_result.subject = found_subject_tokens
-                    extra_tokens = []
-                    if ('ARGM-LOC' in srl.keys()) and (Helper.merge_tokens(srl['ARGM-LOC']) not in full_predicate_text):
-                        extra_tokens.extend(srl['ARGM-LOC'])
-                    current_result.extra_field = extra_tokens
-                    current_result.type = 'srl_temporal'
-                    current_result.key_answer = srl['ARGM-TMP']
-                    deconstruction_result.append(current_result)
-                    
-            if found_subject_text and found_subject_text != found_object_text:       
-                # Locative question
-                if 'ARGM-LOC' in srl:
-                    current_result = QDeconstructionResult()
-                    current_result.predicate = full_predicate
-                    current_result.object = found_object_tokens
-                    current_result.subject = found_subject_tokens
-                    extra_tokens = []
-                    if ('ARGM-TMP' in srl.keys()) and (Helper.merge_tokens(srl['ARGM-TMP']) not in full_predicate_text):
-                        extra_tokens.extend(srl['ARGM-TMP'])
-                    current_result.extra_field = extra_tokens
-                    current_result.type = 'srl_locative'
-                    current_result.key_answer = srl['ARGM-LOC']
-                    deconstruction_result.append(current_result)
-       
+        if found_subject_text and found_subject_text != found_object_text:
+            # Purpose question
+            if 'ARGM-PNC' in srl.keys() or 'ARGM-PRP' in srl.keys():
+                current_result = QDeconstructionResult()
+                current_result.predicate = full_predicate
+                current_result.object = found_object_tokens
+                current_result.subject = found_subject_tokens
+                extra_tokens = []
+                if ('ARGM-LOC' in srl.keys()) and (Helper.merge_tokens(srl['ARGM-LOC']) not in full_predicate_text):
+                    extra_tokens.extend(srl['ARGM-LOC'])
+                if ('ARGM-TMP' in srl.keys()) and (Helper.merge_tokens(srl['ARGM-TMP']) not in full_predicate_text):
+                    extra_tokens.extend(srl['ARGM-TMP']) 
+                current_result.extra_field = extra_tokens
+                current_result.type = 'srl_purpose'
+                if 'ARGM-PNC' in srl.keys():
+                    current_result.key_answer = srl['ARGM-PNC']
+                elif 'ARGM-PRP' in srl.keys():
+                    current_result.key_answer = srl['ARGM-PRP']
+                else:
+                    current_result.key_answer = []
+                deconstruction_result.append(current_result)
+        
+        if found_subject_text and found_subject_text != found_object_text:  
+            # Manner question
+            if 'ARGM-MNR' in srl:
+                current_result = QDeconstructionResult()
+                current_result.predicate = full_predicate
+                current_result.object = found_object_tokens
+                current_result.subject = found_subject_tokens
+                extra_tokens = []
+                if ('ARGM-LOC' in srl.keys()) and (Helper.merge_tokens(srl['ARGM-LOC']) not in full_predicate_text):
+                    extra_tokens.extend(srl['ARGM-LOC'])
+                if ('ARGM-TMP' in srl.keys()) and (Helper.merge_tokens(srl['ARGM-TMP']) not in full_predicate_text):
+                    extra_tokens.extend(srl['ARGM-TMP']) 
+                current_result.extra_field = extra_tokens
+                current_result.type = 'srl_manner'
+                current_result.key_answer = srl['ARGM-MNR']
+                deconstruction_result.append(current_result)
+                
+        if found_subject_text and found_subject_text != found_object_text:     
+            # Temporal question
+            if 'ARGM-TMP' in srl:
+                current_result = QDeconstructionResult()
+                current_result.predicate = full_predicate
+                current_result.object = found_object_tokens
+                current_result.subject = found_subject_tokens
+                extra_tokens = []
+                if ('ARGM-LOC' in srl.keys()) and (Helper.merge_tokens(srl['ARGM-LOC']) not in full_predicate_text):
+                    extra_tokens.extend(srl['ARGM-LOC'])
+                current_result.extra_field = extra_tokens
+                current_result.type = 'srl_temporal'
+                current_result.key_answer = srl['ARGM-TMP']
+                deconstruction_result.append(current_result)
+                
+        if found_subject_text and found_subject_text != found_object_text:       
+            # Locative question
+            if 'ARGM-LOC' in srl:
+                current_result = QDeconstructionResult()
+                current_result.predicate = full_predicate
+                current_result.object = found_object_tokens
+                current_result.subject = found_subject_tokens
+                extra_tokens = []
+                if ('ARGM-TMP' in srl.keys()) and (Helper.merge_tokens(srl['ARGM-TMP']) not in full_predicate_text):
+                    extra_tokens.extend(srl['ARGM-TMP'])
+                current_result.extra_field = extra_tokens
+                current_result.type = 'srl_locative'
+                current_result.key_answer = srl['ARGM-LOC']
+                deconstruction_result.append(current_result)
         return deconstruction_result
     
     
+    def _deconstruct_word(self, word: Token, srls: List[dict] = None) -> List[QDeconstructionResult]:
+        """Deconstructs a word by its dependency label, pcomp words are only matched with `srls` (all SRLs by default)"""
+        if word.dep_ == 'dobj':
+            return self._deconstruct_dobj(word)
+        elif word.dep_ == 'dative':
+            return self._deconstruct_dative(word)
+        elif word.dep_ == 'pcomp':
+            return self._deconstruct_pcomp(word, srls)
+        elif word.dep_ == 'nsubj' or word.dep_ == 'nsubjpass':
+            return self._deconstruct_nsubj(word)
+        return []
+    
+    
+    def _deconstruct_ner(self, ner: dict, srls: List[dict] = None) -> List[QDeconstructionResult]:
+        """Deconstructs a named entity by its label, it is only matched with `srls` (all SRLs by default)"""
+        if ner['label'] == 'DATE':
+            return self._deconstruct_ner_date(ner, srls)
+        elif ner['label'] == 'LOC':
+            return self._deconstruct_ner_loc(ner, srls)
+        elif ner['label'] == 'CARDINAL':
+            return self._deconstruct_ner_cardinal(ner, srls)
+        elif ner['label'] == 'PERSON':
+            return self._deconstruct_ner_person(ner, srls)
+        return []
+    
+    
     def _deconstruct_dative(self, dative_word: Token) -> List[QDeconstructionResult]:
         """Deconstructs a dative word (or indirect object)"""
         
@@ -272,48 +345,44 @@ class QDeconstructor:
             raise ValueError(f"Word {dative_word} is not of type dative")
 
         deconstruction_result : List[QDeconstructionResult] = []
-        for dobj_word in self.doc:
-            if dobj_word.dep_ == 'dobj':
-                if dobj_word.head != dative_word.head:
-                    continue
-                for srl in self.srls:
-                    if ('V' not in srl.keys()): 
-                        continue
-                    
-                    found_subject_tokens = Helper.checkForAppropriateObjOrSub(srl, 0)
-                    found_object_tokens = Helper.checkForAppropriateObjOrSub(srl, 1)
-                    found_indirect_tokens = Helper.checkForAppropriateObjOrSub(srl, 2)
+        # direct objects sharing the head of the dative, and the SRLs of that head
+        for dobj_word in self.doc_index.children_with_dep(dative_word.head, 'dobj'):
+            for srl in self.doc_index.srls_with_predicate(dobj_word.head):
+                found_subject_tokens = Helper.checkForAppropriateObjOrSub(srl, 0)
+                found_object_tokens = Helper.checkForAppropriateObjOrSub(srl, 1)
+                found_indirect_tokens = Helper.checkForAppropriateObjOrSub(srl, 2)
                     
-                    found_subject_text = Helper.merge_tokens(found_subject_tokens)    
-                    found_object_text = Helper.merge_tokens(found_object_tokens)
-                    found_indirect_text = Helper.merge_tokens(found_indirect_tokens)
+                found_subject_text = Helper.merge_tokens(found_subject_tokens)    
+                found_object_text = Helper.merge_tokens(found_object_tokens)
+                found_indirect_text = Helper.merge_tokens(found_indirect_tokens)
                     
-                    if (found_subject_text == '') or (found_object_text == '') or (found_indirect_text == ''):
-                        continue
-                    if  (found_subject_text == found_object_text) or (found_indirect_text == found_object_text) or (found_indirect_text == found_subject_text):
-                        continue
+                if (found_subject_text == '') or (found_object_text == '') or (found_indirect_text == ''):
+                    continue
+                if  (found_subject_text == found_object_text) or (found_indirect_text == found_object_text) or (found_indirect_text == found_subject_text):
+                    continue
                         
-                    if (dobj_word.head in srl['V']) and (dobj_word.text in found_object_text) and (dative_word.text in found_indirect_text):
-                        if len(srl['V']) == 1:
-                            full_predicate = Helper.find_full_predicate(srl['V'][0])
-                        else:
-                            for pred_token in srl['V']:
-                                if pred_token.tag_.startswith('VB'):
-                                    full_predicate = Helper.find_full_predicate(pred_token)
-                        full_predicate_text = Helper.merge_tokens(full_predicate)
-                        current_result = QDeconstructionResult()
-                        current_result.predicate = full_predicate
-                        current_result.object = found_object_tokens
-                        current_result.subject = found_subject_tokens
-                        current_result.key_answer = found_indirect_tokens
-                        extra_tokens = []
-                        if ('ARGM-LOC' in srl.keys()) and (Helper.merge_tokens(srl['ARGM-LOC']) not in full_predicate_text):
-                            extra_tokens.extend(srl['ARGM-LOC'])
-                        if ('ARGM-TMP' in srl.keys()) and (Helper.merge_tokens(srl['ARGM-TMP']) not in full_predicate_text):
-                            extra_tokens.extend(srl['ARGM-TMP'])
-                        current_result.extra_field = extra_tokens
-                        current_result.type = "dative_question"
-                        deconstruction_result.append(current_result)  
+                if (dobj_word.text in found_object_text) and (dative_word.text in found_indirect_text):
+                    full_predicate = srl['V']
+                    if len(srl['V']) == 1:
+                        full_predicate = Helper.find_full_predicate(srl['V'][0])
+                    else:
+                        for pred_token in srl['V']:
+                            if pred_token.tag_.startswith('VB'):
+                                full_predicate = Helper.find_full_predicate(pred_token)
+                    full_predicate_text = Helper.merge_tokens(full_predicate)
+                    current_result = QDeconstructionResult()
+                    current_result.predicate = full_predicate
+                    current_result.object = found_object_tokens
+                    current_result.subject = found_subject_tokens
+                    current_result.key_answer = found_indirect_tokens
+                    extra_tokens = []
+                    if ('ARGM-LOC' in srl.keys()) and (Helper.merge_tokens(srl['ARGM-LOC']) not in full_predicate_text):
+                        extra_tokens.extend(srl['ARGM-LOC'])
+                    if ('ARGM-TMP' in srl.keys()) and (Helper.merge_tokens(srl['ARGM-TMP']) not in full_predicate_text):
+                        extra_tokens.extend(srl['ARGM-TMP'])
+                    current_result.extra_field = extra_tokens
+                    current_result.type = "dative_question"
+                    deconstruction_result.append(current_result)  
         return deconstruction_result
 
 
@@ -324,9 +393,8 @@ class QDeconstructor:
             raise ValueError(f"Word {dobj_word} is not of type dobj")
         
         deconstruction_result : List[QDeconstructionResult] = []
-        for srl in self.srls:
-            if ('V' not in srl.keys()):
-                continue
+        # SRLs of the head of the direct object
+        for srl in self.doc_index.srls_with_predicate(dobj_word.head):
             found_subject_tokens = Helper.checkForAppropriateObjOrSub(srl, 0)
             found_object_tokens = Helper.checkForAppropriateObjOrSub(srl, 1)
             found_subject_text = Helper.merge_tokens(found_subject_tokens)
@@ -335,7 +403,8 @@ class QDeconstructor:
             if (found_subject_text == '') or (found_object_text == '') or (found_subject_text == found_object_text):
                 continue
             
-            if (dobj_word.head in srl['V']) and (dobj_word.text in found_object_text):
+            if dobj_word.text in found_object_text:
+                full_predicate = srl['V']
                 if len(srl['V']) == 1:
                     full_predicate = Helper.find_full_predicate(srl['V'][0])
                 else:
@@ -359,18 +428,21 @@ class QDeconstructor:
         return deconstruction_result
     
     
-    def _deconstruct_pcomp(self, pcomp_word: Token) -> List[QDeconstructionResult]:
+    def _deconstruct_pcomp(self, pcomp_word: Token, srls: List[dict] = None) -> List[QDeconstructionResult]:
         """Deconstructs a prepositional complement"""
         
         if pcomp_word.dep_ != 'pcomp':
             raise ValueError(f"Word {pcomp_word} is not of type pcomp")
         
         deconstruction_result : List[QDeconstructionResult] = []
-        for srl in self.srls:
+        if srls is None:
+            srls = self.srls
+        for srl in srls:
             if ('V' not in srl.keys()): 
                 continue
             found_subject_tokens = Helper.checkForAppropriateObjOrSub(srl, 0)
             found_subject_text = Helper.merge_tokens(found_subject_tokens)
+            full_predicate = srl['V']
             if len(srl['V']) == 1:
                 full_predicate = Helper.find_full_predicate(srl['V'][0])
             else:
@@ -384,6 +456,7 @@ class QDeconstructor:
                     if (k != 'V') and (pcomp_word.text in Helper.merge_tokens(v) and not (k in ['ARGM-CAU', 'ARGM-LOC'])) and (found_subject_text != ''):
                         # Remove unnecessary words (before pcomp) in pcomp and add them to the extra_field
                         extra_tokens = []
+                        pcomp_idx = 0
                         if pcomp_word in v:
                             pcomp_idx = v.index(pcomp_word)                              
                             for i in range(pcomp_idx):
@@ -419,55 +492,53 @@ class QDeconstructor:
             raise ValueError(f"Expected nsubj or nsubjpass, got {nsubj_word.text} with type of {nsubj_word.dep_}")
 
         deconstruction_result : List[QDeconstructionResult] = []
-        for dobj_word in self.doc:
-            if dobj_word.dep_ == 'dobj':
-                if dobj_word.head != nsubj_word.head:
-                    continue
-                for srl in self.srls:
-                    if ('V' not in srl.keys()): 
-                        continue
-                    
-                    found_subject_tokens = Helper.checkForAppropriateObjOrSub(srl, 0)
-                    found_object_tokens = Helper.checkForAppropriateObjOrSub(srl, 1)
+        # direct objects sharing the head of the nsubj, and the SRLs of that head
+        for dobj_word in self.doc_index.children_with_dep(nsubj_word.head, 'dobj'):
+            for srl in self.doc_index.srls_with_predicate(dobj_word.head):
+                found_subject_tokens = Helper.checkForAppropriateObjOrSub(srl, 0)
+                found_object_tokens = Helper.checkForAppropriateObjOrSub(srl, 1)
                     
-                    found_subject_text = Helper.merge_tokens(found_subject_tokens)    
-                    found_object_text = Helper.merge_tokens(found_object_tokens)
+                found_subject_text = Helper.merge_tokens(found_subject_tokens)    
+                found_object_text = Helper.merge_tokens(found_object_tokens)
                     
-                    if (found_subject_text == '') or (found_object_text == ''):
-                        continue
-                    if  (found_subject_text == found_object_text):
-                        continue
+                if (found_subject_text == '') or (found_object_text == ''):
+                    continue
+                if  (found_subject_text == found_object_text):
+                    continue
                         
-                    if (dobj_word.head in srl['V']) and (dobj_word.text in found_object_text) and (nsubj_word.text in found_subject_text):
-                        if len(srl['V']) == 1:
-                            full_predicate = Helper.find_full_predicate(srl['V'][0])
-                        else:
-                            for pred_token in srl['V']:
-                                if pred_token.tag_.startswith('VB'):
-                                    full_predicate = Helper.find_full_predicate(pred_token)
-                        full_predicate_text = Helper.merge_tokens(full_predicate)
-                        current_result = QDeconstructionResult()
-                        current_result.predicate = full_predicate
-                        current_result.object = found_object_tokens
-                        current_result.subject = found_subject_tokens
-                        current_result.key_answer = found_subject_tokens
-                        extra_tokens = []
-                        if ('ARGM-LOC' in srl.keys()) and (Helper.merge_tokens(srl['ARGM-LOC']) not in full_predicate_text):
-                            extra_tokens.extend(srl['ARGM-LOC'])
-                        if ('ARGM-TMP' in srl.keys()) and (Helper.merge_tokens(srl['ARGM-TMP']) not in full_predicate_text):
-                            extra_tokens.extend(srl['ARGM-TMP'])
-                        current_result.extra_field = extra_tokens
-                        current_result.type = "nsubj_question"
-                        deconstruction_result.append(current_result)  
+                if (dobj_word.text in found_object_text) and (nsubj_word.text in found_subject_text):
+                    full_predicate = srl['V']
+                    if len(srl['V']) == 1:
+                        full_predicate = Helper.find_full_predicate(srl['V'][0])
+                    else:
+                        for pred_token in srl['V']:
+                            if pred_token.tag_.startswith('VB'):
+                                full_predicate = Helper.find_full_predicate(pred_token)
+                    full_predicate_text = Helper.merge_tokens(full_predicate)
+                    current_result = QDeconstructionResult()
+                    current_result.predicate = full_predicate
+                    current_result.object = found_object_tokens
+                    current_result.subject = found_subject_tokens
+                    current_result.key_answer = found_subject_tokens
+                    extra_tokens = []
+                    if ('ARGM-LOC' in srl.keys()) and (Helper.merge_tokens(srl['ARGM-LOC']) not in full_predicate_text):
+                        extra_tokens.extend(srl['ARGM-LOC'])
+                    if ('ARGM-TMP' in srl.keys()) and (Helper.merge_tokens(srl['ARGM-TMP']) not in full_predicate_text):
+                        extra_tokens.extend(srl['ARGM-TMP'])
+                    current_result.extra_field = extra_tokens
+                    current_result.type = "nsubj_question"
+                    deconstruction_result.append(current_result)  
         return deconstruction_result
     
     
-    def _deconstruct_ner_date(self, date_ner: dict) -> List[QDeconstructionResult]:
+    def _deconstruct_ner_date(self, date_ner: dict, srls: List[dict] = None) -> List[QDeconstructionResult]:
         """Deconstructs a date named entity. Dict should have the following keys: 'label', 'tokens'"""
 
         deconstruction_result : List[QDeconstructionResult] = []
         date_text = Helper.merge_tokens(date_ner['tokens'])
-        for srl in self.srls:
+        if srls is None:
+            srls = self.srls
+        for srl in srls:
             if ('V' not in srl.keys()):
                 continue
             
@@ -482,6 +553,7 @@ class QDeconstructor:
                 if (k != 'V') and (k != 'ARGM-TMP'):
                     text_v = Helper.merge_tokens(v)
                     if (date_text in text_v) and (text_v != found_subject_text) and (text_v != found_object_text):
+                        full_predicate = srl['V']
                         if len(srl['V']) == 1:
                             full_predicate = Helper.find_full_predicate(srl['V'][0])
                         else:
@@ -503,12 +575,14 @@ class QDeconstructor:
         return deconstruction_result
     
     
-    def _deconstruct_ner_loc(self, loc_ner: dict) -> List[QDeconstructionResult]:
+    def _deconstruct_ner_loc(self, loc_ner: dict, srls: List[dict] = None) -> List[QDeconstructionResult]:
         """Deconstructs a location named entity. Dict should have the following keys: 'label', 'tokens'"""
         
         deconstruction_result : List[QDeconstructionResult] = []
         loc_text = Helper.merge_tokens(loc_ner['tokens'])
-        for srl in self.srls:
+        if srls is None:
+            srls = self.srls
+        for srl in srls:
             if ('V' not in srl.keys()):
                 continue
             found_subject_tokens = Helper.checkForAppropriateObjOrSub(srl, 0)
@@ -519,6 +593,7 @@ class QDeconstructor:
             if (found_subject_text == '') or (found_subject_text == found_object_text): 
                 continue
             
+            full_predicate = srl['V']
             if len(srl['V']) == 1:
                 full_predicate = Helper.find_full_predicate(srl['V'][0])
             else:
@@ -531,8 +606,10 @@ class QDeconstructor:
                 if (loc_text in text_v) and (k != 'V') and (k != 'ARGM-LOC') and (text_v != found_subject_text):
                     real_object = []
                     if (found_object_text != '') and (text_v == found_object_text):
-                        for l in range(len(self.doc)-1):
-                            if (self.doc[l] not in v) or (self.doc[l+1] not in v):
+                        # only pairs of consecutive tokens that are both in v can pass
+                        v_indices = {tok.i for tok in v}
+                        for l in sorted(v_indices):
+                            if (l + 1) not in v_indices:
                                 continue
                             if (self.doc[l+1] in loc_ner['tokens']) and (self.doc[l].pos_ == 'ADP'):
                                 break
@@ -557,12 +634,14 @@ class QDeconstructor:
         return deconstruction_result
                     
                     
-    def _deconstruct_ner_cardinal(self, cardinal_ner: dict) -> List[QDeconstructionResult]:
+    def _deconstruct_ner_cardinal(self, cardinal_ner: dict, srls: List[dict] = None) -> List[QDeconstructionResult]:
         """Deconstructs a cardinal number named entity. Dict should have the following keys: 'label', 'tokens'"""
         
         deconstruction_result : List[QDeconstructionResult] = []
         cardinal_text = Helper.merge_tokens(cardinal_ner['tokens'])
-        for srl in self.srls:
+        if srls is None:
+            srls = self.srls
+        for srl in srls:
             if ('V' not in srl.keys()):
                 continue
             found_subject_tokens = Helper.checkForAppropriateObjOrSub(srl, 0)
@@ -572,6 +651,7 @@ class QDeconstructor:
             
             if (found_subject_text == '') or (found_subject_text == found_object_text):
                 continue
+            full_predicate = srl['V']
             if len(srl['V']) == 1:
                 full_predicate = Helper.find_full_predicate(srl['V'][0])
             else:
@@ -622,12 +702,14 @@ class QDeconstructor:
         return deconstruction_result
 
     
-    def _deconstruct_ner_person(self, person_ner: dict) -> List[QDeconstructionResult]:
+    def _deconstruct_ner_person(self, person_ner: dict, srls: List[dict] = None) -> List[QDeconstructionResult]:
         """Deconstructs a person named entity. Dict should have the following keys: 'label', 'tokens'"""
         
         deconstruction_result : List[QDeconstructionResult] = []
         person_text = Helper.merge_tokens(person_ner['tokens'])
-        for srl in self.srls:
+        if srls is None:
+            srls = self.srls
+        for srl in srls:
             if ('V' not in srl.keys()):
                 continue
             
@@ -637,6 +719,7 @@ class QDeconstructor:
             found_object_text = Helper.merge_tokens(found_object_tokens)
             if (found_subject_text == '') or (found_subject_text == found_object_text): 
                 continue
+            full_predicate = srl['V']
             if len(srl['V']) == 1:
                 full_predicate = Helper.find_full_predicate(srl['V'][0])
             else:
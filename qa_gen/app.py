@@ -2,6 +2,7 @@ import os
 import json
 import re
 import warnings
+from typing import Dict, List
 
 from flask import Flask, request, jsonify
 import spacy
@@ -9,6 +10,13 @@ from allennlp.predictors import Predictor
 from fastcoref import spacy_component
 from QConstructor import QConstructor
 from QDeconstructor import QDeconstructor
+from coref_windows import COREF_WINDOW_OVERLAP, COREF_WINDOW_TOKENS, resolve_windowed_coref
+from doc_index import DocIndex
+from incremental import DocumentState, IncrementalDeconstructor, create_incremental_store, sentence_srl_spans, token_spans
+from parse_cache import create_parse_cache
+from spacy.tokens import Token
+from srl import predict_tokenized_batch, srl_cache_key, srl_spans, srl_tokens
+from srl_cache import create_srl_cache
 
 warnings.filterwarnings("ignore")
 
@@ -17,6 +25,13 @@ app = Flask(__name__)
 cur_dir = os.getcwd()
 CONTRACTIONS_PATH = os.path.join(cur_dir, 'utility_files', 'contractions.json')
 SRL_MODEL_PATH = 'https://storage.googleapis.com/allennlp-public-models/structured-prediction-srl-bert.2020.12.15.tar.gz'
+# Number of (sentence, verb) instances labeled together by one SRL forward pass
+SRL_BATCH_SIZE = int(os.environ.get('SRL_BATCH_SIZE', '16'))
+# Number of contexts parsed and resolved by fastcoref together by one nlp.pipe batch
+SPACY_BATCH_SIZE = int(os.environ.get('SPACY_BATCH_SIZE', '32'))
+# Worker processes of nlp.pipe, each one loads its own copy of the spaCy and fastcoref models.
+# Only use it with fastcoref on the CPU, a CUDA model can not be shared with forked processes
+SPACY_N_PROCESS = int(os.environ.get('SPACY_N_PROCESS', '1'))
 
 contractions_dict = json.loads(open(CONTRACTIONS_PATH).read())
 contractions_re = re.compile('(%s)' % '|'.join(contractions_dict.keys()))
@@ -24,6 +39,14 @@ contractions_re = re.compile('(%s)' % '|'.join(contractions_dict.keys()))
 nlp = spacy.load('en_core_web_sm')
 nlp.add_pipe("fastcoref")
 predictor = Predictor.from_path(SRL_MODEL_PATH)
+# Persistent SRL results of already seen sentences (see srl_cache.py)
+srl_cache = create_srl_cache(SRL_MODEL_PATH)
+# Persistent parsed documents and SRLs of already seen contexts (see parse_cache.py)
+parse_cache = create_parse_cache(
+    f"{nlp.meta['lang']}_{nlp.meta['name']}-{nlp.meta['version']}\0{SRL_MODEL_PATH}\0coref_window={COREF_WINDOW_TOKENS},{COREF_WINDOW_OVERLAP}"
+)
+# Last version of the documents generated with a document id (see incremental.py)
+incremental_store = create_incremental_store()
 
 
 def expandContractions(s, contractions_dict=contractions_dict):
@@ -32,70 +55,126 @@ def expandContractions(s, contractions_dict=contractions_dict):
     return contractions_re.sub(replace, s)
 
 
-def generate(text: str, enhance_level: int, limit: int, verbose=False):
-    text = expandContractions(text)
-    textList = []
-    textList.append(text)
-    
-    doc = nlp(u''+text, component_cfg={"fastcoref": {'resolve_text': True}})  # See https://github.com/shon-otmazgin/fastcoref
-    
+def predict_srl(sentences: List[List[Token]], batch_size: int = SRL_BATCH_SIZE) -> List[dict]:
+    """
+    Label the spaCy tokens of every sentence that is not in the SRL cache. Sentences are sorted by length
+    so that the (sentence, verb) instances of each padded batch of at most `batch_size` waste few positions.
+    """
+    keys = [srl_cache_key(tokens) for tokens in sentences]
+    cached = srl_cache.get_many(keys) if srl_cache is not None else {}
+    missing = {}
+    for key, tokens in zip(keys, sentences):
+        if key not in cached:
+            missing.setdefault(key, tokens)
+    missing_keys = sorted(missing, key=lambda key: len(missing[key]))
+    predicted = dict(zip(
+        missing_keys,
+        predict_tokenized_batch(predictor, [missing[key] for key in missing_keys], batch_size)
+    ))
+    if srl_cache is not None and predicted:
+        srl_cache.put_many(predicted)
+
+    return [cached[key] if key in cached else predicted[key] for key in keys]
+
+
+def parse_many(texts: List[str], verbose=False, known_srl_spans: Dict[str, List[dict]] = None):
+    """
+    Parse the contexts that are not in the parse cache with spaCy and fastcoref, and label their sentences with SRL.
+    The SRL spans of the sentences in `known_srl_spans` (see incremental.sentence_srl_spans) are reused.
+    Return the (doc, srls) of every context, srls are (start, end) token index ranges of the doc.
+    """
+    known_srl_spans = known_srl_spans or {}
+    cached = parse_cache.get_many(texts, nlp.vocab) if parse_cache is not None else {}
+    missing = list(dict.fromkeys(text for text in texts if text not in cached))
+
+    n_process = max(1, min(SPACY_N_PROCESS, len(missing) // SPACY_BATCH_SIZE))
+    if COREF_WINDOW_TOKENS > 0:
+        # Long-document mode: fastcoref runs over overlapping windows of sentences of the parsed contexts
+        docs = list(nlp.pipe(missing, batch_size=SPACY_BATCH_SIZE, n_process=n_process, disable=['fastcoref']))
+        resolve_windowed_coref(nlp.get_pipe('fastcoref'), docs, COREF_WINDOW_TOKENS, COREF_WINDOW_OVERLAP, SPACY_BATCH_SIZE)
+    else:
+        # fastcoref resolves the contexts of each nlp.pipe batch together, see https://github.com/shon-otmazgin/fastcoref
+        # Only its clusters are used, the resolved text is not computed
+        docs = list(nlp.pipe(missing, batch_size=SPACY_BATCH_SIZE, n_process=n_process))
     
-    srls = []
-    for sent in doc.sents:
-        sent_start = sent.start_char
-        sent_text = sent.text
-        srlResult = predictor.predict_json({"sentence": sent_text})
+    # SRL runs on the spaCy tokens, so its tags are aligned with the tokens of the documents
+    doc_sents = [[srl_tokens(sent) for sent in doc.sents] for doc in docs]
+    srlResults = iter(predict_srl([
+        tokens for sents in doc_sents for tokens in sents if srl_cache_key(tokens) not in known_srl_spans
+    ]))
+
+    parsed = {}
+    for text, doc, sents in zip(missing, docs, doc_sents):
+        srls = []
+        for tokens in sents:
+            key = srl_cache_key(tokens)
+            if key in known_srl_spans:
+                srls.extend(token_spans(known_srl_spans[key], tokens))
+                continue
+            srlResult = next(srlResults)
+            if verbose:
+                print('--> SRL Result:', srlResult)
+            srls.extend(srl_spans(tokens, srlResult))
+        parsed[text] = (doc, srls)
+    if parse_cache is not None and parsed:
+        parse_cache.put_many(parsed)
+
+    return [cached[text] if text in cached else parsed[text] for text in texts]
+
+
+def generate_many(texts: List[str], enhance_level: int, limit: int, verbose=False, document_ids: List[str] = None):
+    """
+    Generate the questions of several contexts, the SRL of all of their sentences runs in shared batches.
+    A context with a document id is generated incrementally: the SRLs and the deconstruction results of the
+    sentences that did not change since the last version of the document are reused (see incremental.py).
+    """
+    texts = [expandContractions(text) for text in texts]
+    if document_ids is None or incremental_store is None:
+        document_ids = [None] * len(texts)
+    previous_states = [incremental_store.get(document_id) if document_id is not None else None for document_id in document_ids]
+    known_srl_spans = {}
+    for state in previous_states:
+        if state is not None:
+            known_srl_spans.update(state.srl_spans)
+
+    results = []
+    parses = parse_many(texts, verbose=verbose, known_srl_spans=known_srl_spans)
+    for (doc, srls), document_id, previous_state in zip(parses, document_ids, previous_states):
         if verbose:
-            print('--> SRL Result:', srlResult)
-        words = srlResult['words']
-        word_offsets = []
-        current_offset = 0
+            print('[SRL_GQ] SRLs:')
+            for srl in srls:
+                print('-'*50)
+                for key, value in srl.items():
+                    print(f'{key}: {doc[value[0]:value[1]].text}')
+                    
+        doc_index = DocIndex(doc, srls)
+        if document_id is None:
+            qdeconstructor = QDeconstructor(doc_index)
+            qdeconstruct_result = qdeconstructor.deconstruct()
+        else:
+            qdeconstructor = IncrementalDeconstructor(doc_index, previous_state)
+            qdeconstruct_result = qdeconstructor.deconstruct()
+            incremental_store.put(
+                document_id,
+                DocumentState(sentence_srl_spans(doc, srls), qdeconstructor.deconstructions),
+                reused=qdeconstructor.reused,
+                computed=qdeconstructor.computed,
+            )
         
-        for word in words:
-            start = sent_text.find(word, current_offset)
-            if start == -1:
-                continue
-            end = start + len(word)
-            word_offsets.append((start + sent_start, end + sent_start))
-            current_offset = end
-
-        verbs = srlResult['verbs']
-        for verb in verbs:
-            tags = verb['tags']
-            tag_offsets = {}
-            for tag, word_offset in zip(tags, word_offsets):
-                if tag == 'O':
-                    continue
-                if tag[2:] not in tag_offsets.keys():
-                    tag_offsets[tag[2:]] = [word_offset]
-                else:
-                    tag_offsets[tag[2:]].append(word_offset)
-            
-            mod_tag_offsets = {}
-            for tag, offsets in tag_offsets.items():
-                min_offset = min(offset[0] for offset in offsets)
-                max_offset = max(offset[1] for offset in offsets)
-                mod_tag_offsets[tag] = (min_offset, max_offset)
-            srls.append(mod_tag_offsets)
-
-    if verbose:
-        print('[SRL_GQ] SRLs:')
-        for srl in srls:
-            print('-'*50)
-            for key, value in srl.items():
-                print(f'{key}: {text[value[0]:value[1]]}')
-                
-    qdeconstructor = QDeconstructor(doc, srls)
-    qdeconstruct_result = qdeconstructor.deconstruct()
-    
-    question_constructor = QConstructor(doc, srls, enhance_level)
-    found_questions = question_constructor.constructQuestion(qdeconstruct_result, 
-                                                             limit=limit, 
-                                                             selection_method='random',
-                                                             type_name='direct',
-                                                             verbose=verbose,)
+        question_constructor = QConstructor(doc_index, enhance_level)
+        found_questions = question_constructor.constructQuestion(qdeconstruct_result, 
+                                                                 limit=limit, 
+                                                                 selection_method='random',
+                                                                 type_name='direct',
+                                                                 verbose=verbose,)
+        results.append(found_questions)
     
-    return found_questions
+    return results
+
+
+def generate(text: str, enhance_level: int, limit: int, verbose=False, document_id: str = None):
+    document_ids = [document_id] if document_id is not None else None
+    return generate_many([text], enhance_level, limit, verbose=verbose, document_ids=document_ids)[0]
 
 
 @app.route('/generate_qa', methods=['POST'])
@@ -104,13 +183,53 @@ def generate_qa():
     context = data.get('context', None)
     enhance_level = data.get('enhance_level', 2)
     limit = data.get('limit', 100)
+    document_id = data.get('document_id', None)
     if not context:
         return jsonify({"error": "No text provided"}), 400
+    if document_id is not None and not isinstance(document_id, str):
+        return jsonify({"error": "document_id must be a string"}), 400
     try:
-        qa_pairs = generate(context, enhance_level, limit, verbose=False)
+        qa_pairs = generate(context, enhance_level, limit, verbose=False, document_id=document_id)
         return jsonify(qa_pairs)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/generate_qa_batch', methods=['POST'])
+def generate_qa_batch():
+    data = request.json
+    contexts = data.get('contexts', None)
+    enhance_level = data.get('enhance_level', 2)
+    limit = data.get('limit', 100)
+    if not contexts or not isinstance(contexts, list) or not all(isinstance(context, str) and context for context in contexts):
+        return jsonify({"error": "No texts provided"}), 400
+    document_ids = data.get('document_ids', None)
+    if document_ids is not None and (not isinstance(document_ids, list) or len(document_ids) != len(contexts)):
+        return jsonify({"error": "document_ids must have one id per context"}), 400
+    if document_ids is not None and not all(isinstance(document_id, str) for document_id in document_ids):
+        return jsonify({"error": "document_ids must be strings"}), 400
+    try:
+        qa_pairs = generate_many(contexts, enhance_level, limit, verbose=False, document_ids=document_ids)
+        return jsonify(qa_pairs)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/incremental_stats', methods=['GET'])
+def incremental_stats():
+    if incremental_store is None:
+        return jsonify({"enabled": False})
+    return jsonify(incremental_store.stats())
+
+@app.route('/parse_cache_stats', methods=['GET'])
+def parse_cache_stats():
+    if parse_cache is None:
+        return jsonify({"enabled": False})
+    return jsonify(parse_cache.stats())
+
+@app.route('/srl_cache_stats', methods=['GET'])
+def srl_cache_stats():
+    if srl_cache is None:
+        return jsonify({"enabled": False})
+    return jsonify(srl_cache.stats())
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=8001, debug=False)
@@ -0,0 +1,55 @@
+"""
+Compare the per-call cost of lemmatizing verbs with a new WordNetLemmatizer on every call (the former
+utils.lemmatizeVerb) and with the shared, memoized utils.lemmatizeVerb, on a stream of inflected verbs where
+a few frequent verbs make most of the calls like in the predicates of real passages. Requires WordNet
+(`python -m nltk.downloader wordnet`).
+
+    python benchmark_lemmatize.py
+"""
+import random
+import sys
+import time
+
+from nltk.stem import WordNetLemmatizer
+
+import utils
+
+VERBS = [
+    'is', 'was', 'has', 'had', 'does', 'did', 'made', 'makes', 'found', 'finds', 'lived', 'lives', 'used', 'uses',
+    'came', 'comes', 'began', 'begins', 'cut', 'cuts', 'lost', 'loses', 'died', 'dies', 'closed', 'closes',
+    'saved', 'saves', 'paid', 'pays', 'protected', 'protects', 'grew', 'grows', 'went', 'goes', 'took', 'takes',
+    'gave', 'gives', 'built', 'builds', 'studied', 'studies', 'wrote', 'writes', 'ran', 'runs', 'visited', 'visits',
+]
+NUM_CALLS = 20000
+
+
+def lemmatize_with_new_lemmatizer(verb):
+    lemmatizer = WordNetLemmatizer()
+    return lemmatizer.lemmatize(verb, pos='v')
+
+
+def per_call_us(lemmatize, verbs):
+    start = time.perf_counter()
+    for verb in verbs:
+        lemmatize(verb)
+    return 1e6 * (time.perf_counter() - start) / len(verbs)
+
+
+def main():
+    if utils._get_lemmatizer() is None:
+        sys.exit('WordNet is not installed, run `python -m nltk.downloader wordnet` first')
+    rng = random.Random(0)
+    # Zipf-like verb frequencies
+    verbs = rng.choices(VERBS, weights=[1 / (rank + 1) for rank in range(len(VERBS))], k=NUM_CALLS)
+
+    assert all(lemmatize_with_new_lemmatizer(verb) == utils.lemmatizeVerb(verb) for verb in VERBS)
+    before = per_call_us(lemmatize_with_new_lemmatizer, verbs)
+    utils._wordnet_verb_lemma.cache_clear()
+    after = per_call_us(utils.lemmatizeVerb, verbs)
+    print(f"{'calls':>8}{'new lemmatizer us/call':>24}{'memoized us/call':>18}{'speedup':>9}")
+    print(f"{NUM_CALLS:>8}{before:>24.2f}{after:>18.2f}{before / after:>8.1f}x")
+    print(utils._wordnet_verb_lemma.cache_info())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Check that generating the versions of an edited document incrementally (with a document id) gives the same
+QA pairs as generating every version from scratch, on a document that repeats one of its sentences. Loads the
+models of app.py, the parse cache is bypassed so that every version is parsed and labeled again.
+
+    python check_incremental.py
+"""
+import random
+import sys
+
+import app
+
+REPEATED = "The Yanomami live along the rivers of the rainforest in the north of Brazil."
+VERSIONS = [
+    f"{REPEATED} They have lived in the rainforest for about 10,000 years. {REPEATED}",
+    f"{REPEATED} They have lived in the rainforest for about 10,000 years and they use more than 2,000 plants. {REPEATED}",
+    f"{REPEATED} In 1988, someone found gold in their forest. {REPEATED} They have lived in the rainforest for about 10,000 years and they use more than 2,000 plants. {REPEATED}",
+    f"{REPEATED}  In 1988, someone found gold in their forest. {REPEATED} {REPEATED}",
+]
+ENHANCE_LEVEL = 2
+LIMIT = 1000
+
+
+def generate(text, document_id=None):
+    # same shuffle of the deconstruction results in both runs
+    random.seed(0)
+    return app.generate(text, ENHANCE_LEVEL, LIMIT, document_id=document_id)
+
+
+def main():
+    if app.incremental_store is None:
+        sys.exit('The incremental mode is disabled, unset INCREMENTAL_DOCUMENTS or set it above 0')
+    app.parse_cache = None
+
+    failures = 0
+    for version, text in enumerate(VERSIONS):
+        incremental = generate(text, document_id='check_incremental')
+        scratch = generate(text)
+        same = incremental == scratch
+        failures += not same
+        print(f"version {version}: {len(scratch)} QA pairs from scratch, {len(incremental)} incrementally, "
+              f"{'same' if same else 'DIFFERENT'}")
+    print(app.incremental_store.stats())
+    if failures:
+        sys.exit(f'{failures} versions differ')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Coreference resolution of long documents over overlapping windows of sentences.
+
+fastcoref scores every pair of mentions of the text it is given, so its time and memory grow quickly with the
+length of the document. In the long-document mode a document longer than COREF_WINDOW_TOKENS tokens is cut into
+windows of whole sentences of at most that many tokens, consecutive windows share COREF_WINDOW_OVERLAP sentences.
+The clusters of all windows are stitched together: clusters of two windows that share a mention (found in the
+sentences both windows contain) are merged.
+"""
+import os
+from typing import List, Tuple
+
+import spacy.tokens
+
+# The long-document mode is configured from the environment when the service starts, COREF_WINDOW_TOKENS=0 disables it
+COREF_WINDOW_TOKENS = int(os.environ.get('COREF_WINDOW_TOKENS', '0'))
+COREF_WINDOW_OVERLAP = int(os.environ.get('COREF_WINDOW_OVERLAP', '2'))
+
+
+def sentence_windows(sentence_lengths: List[int], max_tokens: int, overlap: int) -> List[Tuple[int, int]]:
+    """
+    (start, end) sentence ranges of the windows: consecutive sentences of at most `max_tokens` tokens in total
+    (or a single longer sentence), the next window starts at most `overlap` sentences before the end of the previous
+    one and always goes past it.
+    """
+    windows = []
+    start = 0
+    while True:
+        end = start
+        tokens = 0
+        while end < len(sentence_lengths) and (end == start or tokens + sentence_lengths[end] <= max_tokens):
+            tokens += sentence_lengths[end]
+            end += 1
+        windows.append((start, end))
+        if end >= len(sentence_lengths):
+            return windows
+        # shorten the overlap until the next window has room for the sentence after this one
+        next_start = max(start + 1, end - overlap)
+        while next_start < end and sum(sentence_lengths[next_start:end + 1]) > max_tokens:
+            next_start += 1
+        start = next_start
+
+
+def stitch_clusters(clusters: List[List[Tuple[int, int]]]) -> List[List[Tuple[int, int]]]:
+    """Merge the clusters that share a mention, mentions and clusters are sorted by their character offsets"""
+    parent = list(range(len(clusters)))
+
+    def find(c):
+        while parent[c] != c:
+            parent[c] = parent[parent[c]]
+            c = parent[c]
+        return c
+
+    owner = {}  # mention -> first cluster containing it
+    for c, cluster in enumerate(clusters):
+        for mention in cluster:
+            if mention in owner:
+                parent[find(c)] = find(owner[mention])
+            else:
+                owner[mention] = c
+
+    merged = {}
+    for c, cluster in enumerate(clusters):
+        merged.setdefault(find(c), set()).update(cluster)
+    return sorted((sorted(mentions) for mentions in merged.values()), key=lambda cluster: cluster[0])
+
+
+def resolve_windowed_coref(coref, docs: List[spacy.tokens.Doc], max_tokens: int, overlap: int, batch_size: int):
+    """
+    Set `doc._.coref_clusters` of every doc with the fastcoref pipe `coref` (character offsets, like fastcoref).
+    Documents of at most `max_tokens` tokens are resolved whole. At most `batch_size` windows are predicted at once.
+    The resolved text is not computed.
+    """
+    windows = []  # (doc index, start char, end char)
+    num_windows = []
+    for d, doc in enumerate(docs):
+        sents = list(doc.sents)
+        if len(doc) <= max_tokens or len(sents) <= 1:
+            ranges = [(0, len(sents))]
+        else:
+            ranges = sentence_windows([len(sent) for sent in sents], max_tokens, overlap)
+        for start, end in ranges:
+            start_char = sents[start].start_char if start > 0 else 0
+            end_char = sents[end - 1].end_char if end < len(sents) else len(doc.text)
+            windows.append((d, start_char, end_char))
+        num_windows.append(len(ranges))
+
+    clusters = [[] for _ in docs]
+    for start in range(0, len(windows), batch_size):
+        batch = windows[start:start + batch_size]
+        preds = coref.coref_model.predict(
+            texts=[docs[d].text[start_char:end_char] for d, start_char, end_char in batch],
+            max_tokens_in_batch=coref.max_tokens_in_batch,
+        )
+        for (d, start_char, _), pred in zip(batch, preds):
+            for cluster in pred.get_clusters(as_strings=False):
+                clusters[d].append([(start_char + s, start_char + e) for s, e in cluster])
+
+    for doc, doc_clusters, count in zip(docs, clusters, num_windows):
+        doc._.coref_clusters = stitch_clusters(doc_clusters) if count > 1 else doc_clusters
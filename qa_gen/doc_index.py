@@ -0,0 +1,83 @@
+from bisect import bisect_left
+from typing import Iterable, List, Set
+
+import spacy.tokens
+from spacy.tokens import Token
+
+
+class DocIndex:
+    """
+    Token lookups of one document, built once and shared by QDeconstructor and QConstructor:
+    tokens by character offset, children by head and dependency label, SRLs by predicate token and SRL arguments by token.
+
+    Args:
+    -----
+    doc: spacy.tokens.Doc
+        Document processed by the spaCy pipeline with fastcoref
+    idx_srls: List[dict]
+        SRLs mapping every tag to a (start, end) range of token indices of the doc
+    """
+
+    def __init__(self, doc: spacy.tokens.Doc, idx_srls: List[dict]):
+        self.doc = doc
+        self._token_starts = [token.idx for token in doc]
+
+        self._children_by_dep = {}
+        for token in doc:
+            self._children_by_dep.setdefault((token.head.i, token.dep_), []).append(token)
+
+        self.srls = []
+        for srl in idx_srls:
+            mod_srl = {}
+            for k, v in srl.items():
+                mod_srl[k] = list(doc[v[0]:v[1]])
+            self.srls.append(mod_srl)
+
+        self._srls_by_predicate = {}
+        for srl in self.srls:
+            for token in srl.get('V', []):
+                self._srls_by_predicate.setdefault(token.i, []).append(srl)
+
+        # token index -> (SRL index, role) of every SRL argument containing the token, in SRL order
+        self._arguments_by_token = {}
+        for srl_idx, srl in enumerate(self.srls):
+            for role, tokens in srl.items():
+                for token in tokens:
+                    self._arguments_by_token.setdefault(token.i, []).append((srl_idx, role))
+
+        # role of the subject (see Helper.checkForAppropriateObjOrSub) of every SRL with a predicate
+        self._subject_roles = {}
+        for srl_idx, srl in enumerate(self.srls):
+            if 'V' not in srl:
+                continue
+            for role in ['ARG0', 'ARG1', 'ARG2', 'ARG3', 'ARG4']:
+                if role in srl:
+                    self._subject_roles[srl_idx] = role
+                    break
+
+        self.clusters = []
+        for cluster in doc._.coref_clusters:
+            self.clusters.append([self.tokens_in(span[0], span[1]) for span in cluster])
+
+    def tokens_in(self, start_char: int, end_char: int) -> List[Token]:
+        """Tokens starting in the character range [start_char, end_char)"""
+        start = bisect_left(self._token_starts, start_char)
+        end = bisect_left(self._token_starts, end_char)
+        return list(self.doc[start:end])
+
+    def children_with_dep(self, head: Token, dep: str) -> List[Token]:
+        """Tokens attached to `head` with the dependency label `dep`, in document order"""
+        return self._children_by_dep.get((head.i, dep), [])
+
+    def srls_with_predicate(self, token: Token) -> List[dict]:
+        """SRLs (as token lists) whose predicate 'V' contains `token`, in SRL order"""
+        return self._srls_by_predicate.get(token.i, [])
+
+    def srls_with_subject_in(self, tokens: Iterable[Token]) -> Set[int]:
+        """Indices of the SRLs with a predicate whose subject contains at least one of `tokens`"""
+        return {
+            srl_idx
+            for token in tokens
+            for srl_idx, role in self._arguments_by_token.get(token.i, [])
+            if self._subject_roles.get(srl_idx) == role
+        }
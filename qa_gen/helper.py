@@ -1,8 +1,10 @@
 from typing import List
 from collections import Counter
 
+import numpy as np
 import spacy
 from spacy import displacy
+from spacy.attrs import DEP, HEAD
 import spacy.tokenizer
 import spacy.tokens
 
@@ -42,6 +44,66 @@ Notation of dependencies:
     acl: clausal modifier of noun
 """
 
+DEPENDENCY_ARRAYS_KEY = 'qa_gen.dependency_arrays'
+
+
+def dependency_arrays(doc: spacy.tokens.Doc):
+    """
+    Dependency label and children (in document order) of every token of the doc, read from `doc.to_array`.
+    Computed once per doc and kept in `doc.user_data`.
+    """
+    arrays = doc.user_data.get(DEPENDENCY_ARRAYS_KEY)
+    if arrays is None:
+        array = doc.to_array([HEAD, DEP]).reshape(len(doc), 2)
+        positions = np.arange(len(doc))
+        # HEAD holds the offset of the head from the token
+        heads = positions + array[:, 0].astype(np.int64)
+        deps = [doc.vocab.strings[int(dep)] for dep in array[:, 1]]
+        children = [[] for _ in range(len(doc))]
+        for i in np.flatnonzero(heads != positions):
+            children[heads[i]].append(int(i))
+        arrays = (deps, children)
+        doc.user_data[DEPENDENCY_ARRAYS_KEY] = arrays
+    return arrays
+
+
+def subtree_indices(token: spacy.tokens.Token, relevant_deps=None) -> set:
+    """
+    Indices of the token and of its descendants reachable through children whose dependency is in `relevant_deps`
+    (every child when it is None)
+    """
+    deps, children = dependency_arrays(token.doc)
+    indices = set()
+    stack = [token.i]
+    while stack:
+        i = stack.pop()
+        indices.add(i)
+        stack.extend(child for child in children[i] if relevant_deps is None or deps[child] in relevant_deps)
+    return indices
+
+
+def phrase_indices(word: spacy.tokens.Token, relevant_deps) -> set:
+    """
+    Like subtree_indices, but the prepositions attached to the word itself are skipped
+    and the case marker of a possessive is kept without following its own children
+    """
+    deps, children = dependency_arrays(word.doc)
+    indices = set()
+    stack = [word.i]
+    while stack:
+        i = stack.pop()
+        if i in indices:
+            continue
+        indices.add(i)
+        for child in children[i]:
+            if deps[i] == "poss" and deps[child] == "case":
+                indices.add(child)
+            elif deps[child] == "prep" and i == word.i:
+                continue
+            elif deps[child] in relevant_deps:
+                stack.append(child)
+    return indices
+
 
 class Helper:
     
@@ -171,18 +233,12 @@ class Helper:
         """
         Simplify dependencies by removing the relative clause if it is not in relative clause itself
         """
-        output_dependencies = [tok for tok in original_tokens]
-        def remove_all_children(token):
-            for child in token.children:
-                remove_all_children(child)
-                if child in output_dependencies:
-                    output_dependencies.remove(child)
-                
+        original_indices = {tok.i for tok in original_tokens}
+        removed_indices = set()
         for token in original_tokens:
-            if token.dep_ == "relcl" and token.head in original_tokens:
-                remove_all_children(token)
-                output_dependencies.remove(token)
-        return output_dependencies
+            if token.dep_ == "relcl" and token.head.i in original_indices:
+                removed_indices.update(subtree_indices(token))
+        return [tok for tok in original_tokens if tok.i not in removed_indices]
     
     
     def find_full_predicate(
@@ -210,7 +266,6 @@ class Helper:
         --------
         List[spacy.tokens.Token]    
         """
-        predicate_tokens = []
         relevant_deps = {"aux", "auxpass", "neg", "prt"}
         if rel_deps is not None:
             relevant_deps = set(rel_deps)
@@ -220,27 +275,15 @@ class Helper:
             relevant_deps = relevant_deps - set(exclude_deps)
                 
         # check if the root token have direct object
-        has_dobj = False
-        for child in token.children:
-            if child.dep_ == "dobj":
-                has_dobj = True
-                break
+        deps, children = dependency_arrays(token.doc)
+        has_dobj = any(deps[child] == "dobj" for child in children[token.i])
         
         if has_dobj:
             if "cc" in relevant_deps and "conj" in relevant_deps:
                 relevant_deps.remove("cc")
                 relevant_deps.remove("conj")
                 
-        def add_related_tokens(token):
-            predicate_tokens.append(token)
-            for child in token.children:
-                if child.dep_ in relevant_deps:
-                    add_related_tokens(child)
-
-        add_related_tokens(token)
-        
-        predicate_tokens = sorted(predicate_tokens, key=lambda token: token.i)
-        return predicate_tokens
+        return [token.doc[i] for i in sorted(subtree_indices(token, relevant_deps))]
     
     
     def find_full_subject(subj_word: spacy.tokens.Token, rel_deps: List[str] = None, is_append: bool = False) -> List[spacy.tokens.Token]:
@@ -260,7 +303,6 @@ class Helper:
         --------
         List[spacy.tokens.Token]
         """
-        subj_tokens = []
         relevant_deps = {"det", "amod", "compound", "nummod", "poss", "cc", "conj", "case"}
         if rel_deps is not None:
             if is_append:
@@ -268,16 +310,7 @@ class Helper:
             else:
                 relevant_deps = rel_deps
                 
-        def add_related_tokens(token):
-            subj_tokens.append(token)
-            for child in token.children:
-                if child.dep_ in relevant_deps:
-                    add_related_tokens(child)
-
-        add_related_tokens(subj_word)
-
-        sorted_tokens = sorted(subj_tokens, key=lambda token: token.i)
-        return sorted_tokens
+        return [subj_word.doc[i] for i in sorted(subtree_indices(subj_word, relevant_deps))]
     
     
     def find_full_direct_object(
@@ -306,7 +339,6 @@ class Helper:
         --------
         List[spacy.tokenizer.Token]
         """        
-        dobj_tokens = []
         relevant_deps = {"det", "amod", "compound", "nummod", "poss", "prep", "advmod", "cc", "conj"}
         
         if rel_deps is not None:
@@ -316,21 +348,7 @@ class Helper:
         if exclude_deps is not None:
             relevant_deps = relevant_deps - set(exclude_deps)
         
-        def add_related_tokens(token):
-            if token not in dobj_tokens:
-                dobj_tokens.append(token)
-                for child in token.children:
-                    if token.dep_ == "poss" and child.dep_ == "case":
-                        dobj_tokens.append(child)
-                    elif child.dep_ == "prep" and token == dobj_word:
-                        continue
-                    elif child.dep_ in relevant_deps:
-                        add_related_tokens(child)
-        
-        add_related_tokens(dobj_word)
-
-        sorted_tokens = sorted(dobj_tokens, key=lambda token: token.i)
-        return sorted_tokens
+        return [dobj_word.doc[i] for i in sorted(phrase_indices(dobj_word, relevant_deps))]
     
     
     def find_full_attribute(
@@ -362,7 +380,6 @@ class Helper:
         --------
         List[spacy.tokenizer.Token]
         """ 
-        attr_tokens = []
         relevant_deps = {"det", "amod", "compound", "nummod", "poss", "prep", "advmod", "cc", "conj"}
         
         if rel_deps is not None:
@@ -377,21 +394,7 @@ class Helper:
         if use_relcl:
             relevant_deps.add("relcl")
         
-        def add_related_tokens(token):
-            if token not in attr_tokens:
-                attr_tokens.append(token)
-                for child in token.children:
-                    if token.dep_ == "poss" and child.dep_ == "case":
-                        attr_tokens.append(child)
-                    elif child.dep_ == "prep" and token == attribute_word:
-                        continue
-                    elif child.dep_ in relevant_deps:
-                        add_related_tokens(child)
-                        
-        add_related_tokens(attribute_word)
-        
-        sorted_tokens = sorted(attr_tokens, key=lambda token: token.i)
-        return sorted_tokens
+        return [attribute_word.doc[i] for i in sorted(phrase_indices(attribute_word, relevant_deps))]
         
     
     def find_full_prep(prep_word: spacy.tokens.Token, rel_deps: List[str] = None, is_append: bool = None) -> str:
@@ -412,7 +415,6 @@ class Helper:
         str
         
         """
-        prep_tokens = []
         relevant_deps = {"pobj", "prep", "advmod", "amod", "det"}
         if rel_deps is not None:
             if is_append:
@@ -420,16 +422,7 @@ class Helper:
             else:
                 relevant_deps = rel_deps
         
-        def add_related_tokens(token):
-            prep_tokens.append(token)
-            for child in token.children:
-                if child.dep_ in relevant_deps:
-                    add_related_tokens(child)
-
-        add_related_tokens(prep_word)
-
-        sorted_tokens = sorted(prep_tokens, key=lambda token: token.i)
-        return " ".join([token.text for token in sorted_tokens])
+        return " ".join([prep_word.doc[i].text for i in sorted(subtree_indices(prep_word, relevant_deps))])
     
     
     def is_in_relative_clause(token: spacy.tokens.Token, relpronoun_exclude: List[str] = None) -> bool:
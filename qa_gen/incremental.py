@@ -0,0 +1,247 @@
+"""
+Incremental regeneration of edited documents.
+
+The last version of every document (identified by a client-chosen document id) leaves a DocumentState behind:
+the SRL spans and the deconstruction results of its sentences, keyed by sentence. The next version reuses them
+for the sentences whose parse did not change, so only the edited sentences are labeled by SRL and deconstructed.
+
+spaCy and fastcoref still parse the whole text, coreference clusters are found over the whole document.
+QConstructor also runs on the whole document since the questions it builds depend on the coreference clusters.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List
+
+import spacy.tokens
+from spacy.tokens import Span, Token
+
+from QDeconstructor import QDeconstructionResult, QDeconstructor
+from doc_index import DocIndex
+from srl import srl_cache_key, srl_tokens
+
+# Number of documents whose last version is kept in memory, INCREMENTAL_DOCUMENTS=0 disables the incremental mode
+INCREMENTAL_DOCUMENTS = int(os.environ.get('INCREMENTAL_DOCUMENTS', '1000'))
+
+# dependency labels of the words deconstructed from their own sentence only, pcomp words are matched with every SRL
+LOCAL_DEPENDENCY_RULES = {'dobj', 'dative', 'nsubj', 'nsubjpass'}
+
+
+def sentence_signature(sent: Span) -> str:
+    """Hash of everything the deconstruction rules read from a sentence: words, tags, dependencies (with heads relative to the sentence), entities and lemmas"""
+    rows = [
+        '\t'.join([token.text, token.whitespace_, token.tag_, token.pos_, token.dep_, str(token.head.i - sent.start),
+                   token.ent_iob_, token.ent_type_, token.lemma_])
+        for token in sent
+    ]
+    return hashlib.sha256('\n'.join(rows).encode('utf-8')).hexdigest()
+
+
+def sentence_srl_spans(doc: spacy.tokens.Doc, srls: List[dict]) -> Dict[str, List[dict]]:
+    """
+    SRL spans of every sentence by SRL cache key, as (start, end) positions in the SRL tokens of the sentence
+    (see srl.srl_tokens), so that they do not depend on the whitespace tokens of the sentence.
+    A sentence that occurs several times in the document has the same SRLs everywhere, only its first
+    occurrence is kept.
+    """
+    sentences = {}
+    first_occurrence = {}  # key -> start of the first sentence with this key
+    for sent in doc.sents:
+        tokens = srl_tokens(sent)
+        key = srl_cache_key(tokens)
+        sentences[sent.start] = (key, {token.i: position for position, token in enumerate(tokens)})
+        first_occurrence.setdefault(key, sent.start)
+    spans = {key: [] for key in first_occurrence}
+    for srl in srls:
+        if not srl:
+            continue
+        sent_start = doc[next(iter(srl.values()))[0]].sent.start
+        key, positions = sentences[sent_start]
+        if first_occurrence[key] != sent_start:
+            continue
+        spans[key].append({tag: (positions[start], positions[end - 1] + 1) for tag, (start, end) in srl.items()})
+    return spans
+
+
+def token_spans(spans: List[dict], tokens: List[Token]) -> List[dict]:
+    """SRL spans of positions in `tokens` (see sentence_srl_spans) as (start, end) token indices of their document"""
+    return [{tag: (tokens[start].i, tokens[end - 1].i + 1) for tag, (start, end) in srl.items()} for srl in spans]
+
+
+def _index_mapping(sentences: List[Span]):
+    """Map token indices of the doc to positions in `sentences` laid end to end (encode) and back (decode)"""
+    ranges = []
+    position = 0
+    for sent in sentences:
+        ranges.append((sent.start, sent.end, position))
+        position += len(sent)
+
+    def encode(i):
+        for start, end, position in ranges:
+            if start <= i < end:
+                return position + i - start
+        raise ValueError(f'Token {i} is outside of the sentences')
+
+    def decode(j):
+        for start, end, position in ranges:
+            if j < position + end - start:
+                return start + j - position
+        raise ValueError(f'Position {j} is outside of the sentences')
+
+    return encode, decode
+
+
+class DocumentState:
+    """
+    What the next version of a document reuses: the SRL spans of its sentences (see sentence_srl_spans) and its
+    deconstruction results (see IncrementalDeconstructor), which are unbound and relative to their sentences.
+    """
+    __slots__ = ('srl_spans', 'deconstructions')
+
+    def __init__(self, srl_spans: Dict[str, List[dict]], deconstructions: Dict[tuple, tuple]):
+        self.srl_spans = srl_spans
+        self.deconstructions = deconstructions
+
+
+class IncrementalDeconstructor(QDeconstructor):
+    """
+    QDeconstructor that reuses the results of the previous version of the document for the sentences with the
+    same signature. Results are returned in the order of QDeconstructor.deconstruct.
+
+    Dependency rules (but pcomp) and SRL rules only read the sentence of the word or predicate, their results are
+    kept by sentence. pcomp and named entity rules match the word or entity with the SRLs of every sentence by
+    text, their results are kept by pair of sentences. Results with tokens outside of their sentences are not kept.
+    """
+
+    def __init__(self, doc_index: DocIndex, previous: DocumentState = None, verbose=False):
+        super().__init__(doc_index, verbose)
+        self.previous = previous.deconstructions if previous is not None else {}
+        # results of this version, for the next one
+        self.deconstructions = {}
+        self.reused = 0
+        self.computed = 0
+
+    def _cached(self, key: tuple, sentences: List[Span], compute) -> List[QDeconstructionResult]:
+        encode, decode = _index_mapping(sentences)
+        if key in self.previous:
+            self.reused += 1
+            stored = self.previous[key]
+            self.deconstructions[key] = stored
+            return [result.remap(decode).bind(self.doc) for result in stored]
+
+        self.computed += 1
+        results = compute()
+        try:
+            self.deconstructions[key] = tuple(result.remap(encode) for result in results)
+        except ValueError:
+            pass
+        return results
+
+    def deconstruct(self) -> List[QDeconstructionResult]:
+        sentences = list(self.doc.sents)
+        signatures = [sentence_signature(sent) for sent in sentences]
+        sentence_of = {}
+        for s, sent in enumerate(sentences):
+            for token in sent:
+                sentence_of[token.i] = s
+        srls_by_sentence = [[] for _ in sentences]
+        for srl in self.srls:
+            if 'V' in srl:
+                srls_by_sentence[sentence_of[srl['V'][0].i]].append(srl)
+
+        def matched_with_srls(kind, a, position, deconstruct_with):
+            """Results of a word or entity of sentence `a` matched with the SRLs of every sentence, in SRL order"""
+            results = []
+            for b, srls in enumerate(srls_by_sentence):
+                if not srls:
+                    continue
+                key = (kind, signatures[a], position, signatures[b], a == b)
+                pair = [sentences[a]] if a == b else [sentences[a], sentences[b]]
+                results.extend(self._cached(key, pair, lambda: deconstruct_with(srls)))
+            return results
+
+        deconstruction_result : List[QDeconstructionResult] = []
+
+        # Dependency parsing rules
+        for a, sent in enumerate(sentences):
+            for word in sent:
+                position = word.i - sent.start
+                if word.dep_ == 'pcomp':
+                    deconstruction_result.extend(
+                        matched_with_srls('pcomp', a, position, lambda srls: self._deconstruct_word(word, srls))
+                    )
+                elif word.dep_ in LOCAL_DEPENDENCY_RULES:
+                    deconstruction_result.extend(
+                        self._cached(('word', signatures[a], position), [sent], lambda: self._deconstruct_word(word))
+                    )
+
+        # Named entity recognition rules
+        for ner in self.ners:
+            a = sentence_of[ner['tokens'][0].i]
+            if sentence_of[ner['tokens'][-1].i] != a:
+                # the signature of the sentence does not cover the entity
+                deconstruction_result.extend(self._deconstruct_ner(ner))
+                continue
+            position = ner['tokens'][0].i - sentences[a].start
+            deconstruction_result.extend(
+                matched_with_srls(('ner', ner['label']), a, position, lambda srls: self._deconstruct_ner(ner, srls))
+            )
+
+        # Semantic role labeling rules
+        for b, srls in enumerate(srls_by_sentence):
+            deconstruction_result.extend(self._cached(
+                ('srl', signatures[b]), [sentences[b]],
+                lambda: [result for srl in srls for result in self._deconstruct_srl(srl)]
+            ))
+
+        return deconstruction_result
+
+
+class IncrementalStore:
+    """In-memory LRU of the DocumentState of the last version of at most `max_documents` documents"""
+
+    def __init__(self, max_documents: int = 1000):
+        self.max_documents = max_documents
+        self._lock = threading.Lock()
+        self._states = OrderedDict()
+        self._versions = 0
+        self._reused = 0
+        self._computed = 0
+
+    def get(self, document_id: str):
+        with self._lock:
+            state = self._states.get(document_id)
+            if state is not None:
+                self._states.move_to_end(document_id)
+            return state
+
+    def put(self, document_id: str, state: DocumentState, reused: int = 0, computed: int = 0):
+        with self._lock:
+            self._states[document_id] = state
+            self._states.move_to_end(document_id)
+            while len(self._states) > self.max_documents:
+                self._states.popitem(last=False)
+            self._versions += 1
+            self._reused += reused
+            self._computed += computed
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._reused + self._computed
+            return {
+                'enabled': True,
+                'max_documents': self.max_documents,
+                'documents': len(self._states),
+                'versions': self._versions,
+                'reused_deconstructions': self._reused,
+                'computed_deconstructions': self._computed,
+                'reuse_rate': self._reused / lookups if lookups else 0.0,
+            }
+
+
+def create_incremental_store():
+    """Return an IncrementalStore configured from the environment, or None when the incremental mode is disabled"""
+    if INCREMENTAL_DOCUMENTS <= 0:
+        return None
+    return IncrementalStore(max_documents=INCREMENTAL_DOCUMENTS)
@@ -11,6 +11,8 @@ from fastcoref import spacy_component
 
 from QConstructor import QConstructor
 from QDeconstructor import QDeconstructor
+from doc_index import DocIndex
+from srl import predict_tokenized_batch, srl_spans, srl_tokens
 
 
 cur_dir = os.getcwd()
@@ -18,6 +20,7 @@ cur_dir = os.getcwd()
 CONTRACTIONS_PATH = os.path.join(cur_dir, 'utility_files', 'contractions.json')
 
 SRL_MODEL_PATH = 'https://storage.googleapis.com/allennlp-public-models/structured-prediction-srl-bert.2020.12.15.tar.gz'
+SRL_BATCH_SIZE = 16
 
 contractions_dict = json.loads(open(CONTRACTIONS_PATH).read())
 contractions_re = re.compile('(%s)' % '|'.join(contractions_dict.keys()))
@@ -49,58 +52,28 @@ def generate(text: str, verbose=False):
     textList = []
     textList.append(text)
     
-    doc = nlp(u''+text, component_cfg={"fastcoref": {'resolve_text': True}})  # See https://github.com/shon-otmazgin/fastcoref
+    doc = nlp(u''+text)  # See https://github.com/shon-otmazgin/fastcoref
     
     
     srls = []
-    for sent in doc.sents:
-        sent_start = sent.start_char
-        sent_text = sent.text
-        srlResult = predictor.predict_json({"sentence": sent_text})
+    sents = [srl_tokens(sent) for sent in doc.sents]
+    for tokens, srlResult in zip(sents, predict_tokenized_batch(predictor, sents, SRL_BATCH_SIZE)):
         if verbose:
             print('--> SRL Result:', srlResult)
-        words = srlResult['words']
-        word_offsets = []
-        current_offset = 0
-        
-        for word in words:
-            start = sent_text.find(word, current_offset)
-            if start == -1:
-                continue
-            end = start + len(word)
-            word_offsets.append((start + sent_start, end + sent_start))
-            current_offset = end
-
-        verbs = srlResult['verbs']
-        for verb in verbs:
-            tags = verb['tags']
-            tag_offsets = {}
-            for tag, word_offset in zip(tags, word_offsets):
-                if tag == 'O':
-                    continue
-                if tag[2:] not in tag_offsets.keys():
-                    tag_offsets[tag[2:]] = [word_offset]
-                else:
-                    tag_offsets[tag[2:]].append(word_offset)
-            
-            mod_tag_offsets = {}
-            for tag, offsets in tag_offsets.items():
-                min_offset = min(offset[0] for offset in offsets)
-                max_offset = max(offset[1] for offset in offsets)
-                mod_tag_offsets[tag] = (min_offset, max_offset)
-            srls.append(mod_tag_offsets)
+        srls.extend(srl_spans(tokens, srlResult))
 
     if verbose:
         print('[SRL_GQ] SRLs:')
         for srl in srls:
             print('-'*50)
             for key, value in srl.items():
-                print(f'{key}: {text[value[0]:value[1]]}')
+                print(f'{key}: {doc[value[0]:value[1]].text}')
                 
-    qdeconstructor = QDeconstructor(doc, srls)
+    doc_index = DocIndex(doc, srls)
+    qdeconstructor = QDeconstructor(doc_index)
     qdeconstruct_result = qdeconstructor.deconstruct()
     
-    question_constructor = QConstructor(doc, srls, 2)
+    question_constructor = QConstructor(doc_index, 2)
     found_questions = question_constructor.constructQuestion(qdeconstruct_result, 
                                                              verbose=True, 
                                                              limit=500, 
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import spacy.tokens
+from spacy.tokens import DocBin
+from spacy.vocab import Vocab
+
+# The cache is configured from the environment when the service starts, PARSE_CACHE_SIZE=0 disables it
+PARSE_CACHE_PATH = os.environ.get('PARSE_CACHE_PATH', os.path.join(os.getcwd(), 'parse_cache.sqlite3'))
+PARSE_CACHE_SIZE = int(os.environ.get('PARSE_CACHE_SIZE', '10000'))
+
+
+class ParseCache:
+    """
+    Persistent cache of parsed contexts in a SQLite file, keyed by the hash of the pipeline identifier and the context.
+    A parsed context is its spaCy Doc, serialized with a DocBin together with the user data that holds the fastcoref
+    clusters, and its SRLs as (start, end) token index ranges (see srl.srl_spans).
+    When it holds more than `max_entries` contexts, the least recently used ones are deleted.
+    """
+
+    def __init__(self, path: str, pipeline_id: str, max_entries: int = 10000):
+        self.path = path
+        self.pipeline_id = pipeline_id
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS parse (key TEXT PRIMARY KEY, doc BLOB NOT NULL, srls TEXT NOT NULL, last_used REAL NOT NULL)'
+            )
+            self._connection.execute('CREATE INDEX IF NOT EXISTS parse_last_used ON parse (last_used)')
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f'{self.pipeline_id}\0{text}'.encode('utf-8')).hexdigest()
+
+    def get_many(self, texts: List[str], vocab: Vocab) -> Dict[str, Tuple[spacy.tokens.Doc, List[dict]]]:
+        """Cached (doc, srls) of `texts`, by text. Docs are restored with the `vocab` of the pipeline that parsed them"""
+        keys = {self.key(text): text for text in texts}
+        rows = []
+        with self._lock:
+            key_list = list(keys)
+            # stay below the SQLite limit on the number of query parameters
+            for start in range(0, len(key_list), 500):
+                chunk = key_list[start:start + 500]
+                rows.extend(self._connection.execute(
+                    f'SELECT key, doc, srls FROM parse WHERE key IN ({",".join("?" * len(chunk))})', chunk
+                ).fetchall())
+            if rows:
+                with self._connection:
+                    now = time.time()
+                    self._connection.executemany(
+                        'UPDATE parse SET last_used = ? WHERE key = ?',
+                        [(now, key) for key, _, _ in rows]
+                    )
+            self._hits += len(rows)
+            self._misses += len(keys) - len(rows)
+
+        found = {}
+        for key, doc_bytes, srls in rows:
+            doc = next(DocBin(store_user_data=True).from_bytes(doc_bytes).get_docs(vocab))
+            found[keys[key]] = (doc, [{tag: tuple(span) for tag, span in srl.items()} for srl in json.loads(srls)])
+        return found
+
+    def put_many(self, parses: Dict[str, Tuple[spacy.tokens.Doc, List[dict]]]):
+        """Store the (doc, srls) of several contexts (by text), then evict the least recently used ones above `max_entries`"""
+        now = time.time()
+        rows = [
+            (self.key(text), DocBin(store_user_data=True, docs=[doc]).to_bytes(), json.dumps(srls), now)
+            for text, (doc, srls) in parses.items()
+        ]
+        with self._lock, self._connection:
+            self._connection.executemany('INSERT OR REPLACE INTO parse (key, doc, srls, last_used) VALUES (?, ?, ?, ?)', rows)
+            size = self._connection.execute('SELECT COUNT(*) FROM parse').fetchone()[0]
+            if size > self.max_entries:
+                self._connection.execute(
+                    'DELETE FROM parse WHERE key IN (SELECT key FROM parse ORDER BY last_used LIMIT ?)',
+                    (size - self.max_entries,)
+                )
+                self._evictions += size - self.max_entries
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._connection.execute('SELECT COUNT(*) FROM parse').fetchone()[0]
+            lookups = self._hits + self._misses
+            return {
+                'enabled': True,
+                'path': self.path,
+                'max_entries': self.max_entries,
+                'size': size,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'evictions': self._evictions,
+            }
+
+
+def create_parse_cache(pipeline_id: str):
+    """Return a ParseCache configured from the environment, or None when it is disabled"""
+    if PARSE_CACHE_SIZE <= 0:
+        return None
+    return ParseCache(PARSE_CACHE_PATH, pipeline_id, max_entries=PARSE_CACHE_SIZE)
@@ -0,0 +1,61 @@
+from typing import List
+
+from spacy.tokens import Span, Token
+
+
+def srl_tokens(sent: Span) -> List[Token]:
+    """Tokens of a spaCy sentence labeled by the SRL model, whitespace tokens are skipped like the predictor's own tokenizer does"""
+    return [token for token in sent if not token.is_space]
+
+
+def verb_indices(tokens: List[Token]) -> List[int]:
+    """
+    Positions of the tokens the SRL predictor builds an instance for: verbs, and auxiliaries since the
+    predictor treats them as verbs for English spaCy models (see SemanticRoleLabelerPredictor.tokens_to_instances)
+    """
+    return [i for i, token in enumerate(tokens) if token.pos_ == 'VERB' or token.pos_ == 'AUX']
+
+
+def srl_cache_key(tokens: List[Token]) -> str:
+    """Text that identifies the SRL result of a sentence: its words and the positions of its verbs"""
+    return '\t'.join(token.text for token in tokens) + '\n' + ','.join(map(str, verb_indices(tokens)))
+
+
+def predict_tokenized_batch(predictor, sentences: List[List[Token]], batch_size: int) -> List[dict]:
+    """
+    Label already tokenized sentences with the AllenNLP SRL `predictor`, without tokenizing them again.
+    Every (sentence, verb) instance of all sentences is run in batches of at most `batch_size` instances.
+    Return, for every sentence, its 'words' and the 'tags' of each of its verbs, aligned with its tokens.
+    """
+    instances_per_sentence = [predictor.tokens_to_instances(tokens) for tokens in sentences]
+    instances = [instance for sentence_instances in instances_per_sentence for instance in sentence_instances]
+    outputs = []
+    for start in range(0, len(instances), batch_size):
+        outputs.extend(predictor.predict_batch_instance(instances[start:start + batch_size]))
+
+    results = []
+    output_index = 0
+    for tokens, sentence_instances in zip(sentences, instances_per_sentence):
+        verbs = outputs[output_index:output_index + len(sentence_instances)]
+        output_index += len(sentence_instances)
+        results.append({
+            'words': [token.text for token in tokens],
+            'verbs': [{'tags': verb['tags']} for verb in verbs],
+        })
+    return results
+
+
+def srl_spans(tokens: List[Token], srlResult: dict) -> List[dict]:
+    """
+    Span of every argument of every verb of an SRL result, as (start, end) token indices in the document of `tokens`.
+    An argument spans from its first to its last tagged token.
+    """
+    srls = []
+    for verb in srlResult['verbs']:
+        tag_indices = {}
+        for tag, token in zip(verb['tags'], tokens):
+            if tag == 'O':
+                continue
+            tag_indices.setdefault(tag[2:], []).append(token.i)
+        srls.append({tag: (min(indices), max(indices) + 1) for tag, indices in tag_indices.items()})
+    return srls
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List
+
+# The cache is configured from the environment when the service starts, SRL_CACHE_SIZE=0 disables it
+SRL_CACHE_PATH = os.environ.get('SRL_CACHE_PATH', os.path.join(os.getcwd(), 'srl_cache.sqlite3'))
+SRL_CACHE_SIZE = int(os.environ.get('SRL_CACHE_SIZE', '200000'))
+
+
+class SrlCache:
+    """
+    Persistent cache of SRL results in a SQLite file, keyed by the hash of the SRL model identifier and the
+    text that identifies a sentence (see srl.srl_cache_key).
+    Only the fields used to build the SRL spans are stored: 'words' and the 'tags' of every verb.
+    When it holds more than `max_entries` results, the least recently used ones are deleted.
+    """
+
+    def __init__(self, path: str, model_id: str, max_entries: int = 200000):
+        self.path = path
+        self.model_id = model_id
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS srl (key TEXT PRIMARY KEY, result TEXT NOT NULL, last_used REAL NOT NULL)'
+            )
+            self._connection.execute('CREATE INDEX IF NOT EXISTS srl_last_used ON srl (last_used)')
+
+    def key(self, sentence_key: str) -> str:
+        return hashlib.sha256(f'{self.model_id}\0{sentence_key}'.encode('utf-8')).hexdigest()
+
+    def get_many(self, sentence_keys: List[str]) -> Dict[str, dict]:
+        """Cached SRL results of the sentences identified by `sentence_keys`, by sentence key"""
+        keys = {self.key(sentence_key): sentence_key for sentence_key in sentence_keys}
+        found = {}
+        with self._lock:
+            key_list = list(keys)
+            # stay below the SQLite limit on the number of query parameters
+            for start in range(0, len(key_list), 500):
+                chunk = key_list[start:start + 500]
+                rows = self._connection.execute(
+                    f'SELECT key, result FROM srl WHERE key IN ({",".join("?" * len(chunk))})', chunk
+                ).fetchall()
+                found.update((keys[key], json.loads(result)) for key, result in rows)
+            if found:
+                with self._connection:
+                    now = time.time()
+                    self._connection.executemany(
+                        'UPDATE srl SET last_used = ? WHERE key = ?',
+                        [(now, self.key(sentence_key)) for sentence_key in found]
+                    )
+            self._hits += len(found)
+            self._misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, results: Dict[str, dict]):
+        """Store the SRL results of several sentences (by sentence key), then evict the least recently used ones above `max_entries`"""
+        now = time.time()
+        rows = [
+            (
+                self.key(sentence_key),
+                json.dumps({'words': result['words'], 'verbs': [{'tags': verb['tags']} for verb in result['verbs']]}),
+                now,
+            )
+            for sentence_key, result in results.items()
+        ]
+        with self._lock, self._connection:
+            self._connection.executemany('INSERT OR REPLACE INTO srl (key, result, last_used) VALUES (?, ?, ?)', rows)
+            size = self._connection.execute('SELECT COUNT(*) FROM srl').fetchone()[0]
+            if size > self.max_entries:
+                self._connection.execute(
+                    'DELETE FROM srl WHERE key IN (SELECT key FROM srl ORDER BY last_used LIMIT ?)',
+                    (size - self.max_entries,)
+                )
+                self._evictions += size - self.max_entries
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._connection.execute('SELECT COUNT(*) FROM srl').fetchone()[0]
+            lookups = self._hits + self._misses
+            return {
+                'enabled': True,
+                'path': self.path,
+                'max_entries': self.max_entries,
+                'size': size,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'evictions': self._evictions,
+            }
+
+
+def create_srl_cache(model_id: str):
+    """Return a SrlCache configured from the environment, or None when it is disabled"""
+    if SRL_CACHE_SIZE <= 0:
+        return None
+    return SrlCache(SRL_CACHE_PATH, model_id, max_entries=SRL_CACHE_SIZE)
@@ -1,8 +1,49 @@
+import os
+import threading
+import warnings
+from functools import lru_cache
 from typing import Dict
 
 import nltk
 from nltk.stem import WordNetLemmatizer
-nltk.download('wordnet')
+
+# Number of distinct verbs whose lemma is memoized by lemmatizeVerb
+LEMMA_CACHE_SIZE = int(os.environ.get('LEMMA_CACHE_SIZE', '4096'))
+
+_lemmatizer = None
+_lemmatizer_lock = threading.Lock()
+_wordnet_missing = False
+
+
+def _get_lemmatizer():
+    """
+    The shared WordNet lemmatizer, WordNet is loaded on the first call from the local nltk data only.
+    Return None when WordNet is not installed (install it once with `python -m nltk.downloader wordnet`).
+    """
+    global _lemmatizer, _wordnet_missing
+    if _lemmatizer is not None or _wordnet_missing:
+        return _lemmatizer
+    with _lemmatizer_lock:
+        if _lemmatizer is None and not _wordnet_missing:
+            try:
+                nltk.data.find('corpora/wordnet.zip')
+            except LookupError:
+                try:
+                    nltk.data.find('corpora/wordnet')
+                except LookupError:
+                    _wordnet_missing = True
+                    warnings.warn('WordNet is not installed, verbs are lemmatized by spaCy')
+                    return None
+            lemmatizer = WordNetLemmatizer()
+            # load the corpus now, the lazy corpus loader is not safe to load from several threads
+            lemmatizer.lemmatize('was', pos='v')
+            _lemmatizer = lemmatizer
+    return _lemmatizer
+
+
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def _wordnet_verb_lemma(verb: str) -> str:
+    return _get_lemmatizer().lemmatize(verb, pos='v')
             
            
 def getValueBetweenTexts(s, first, last):
@@ -13,11 +54,14 @@ def getValueBetweenTexts(s, first, last):
     except ValueError:
         return ""
 
-def lemmatizeVerb(verb):
-    """Lemmatize the given verb and return the base form of the verb"""
-    lemmatizer = WordNetLemmatizer()
-    base_form = lemmatizer.lemmatize(verb, pos='v')
-    return base_form
+def lemmatizeVerb(verb, fallback_lemma=None):
+    """
+    Lemmatize the given verb and return the base form of the verb.
+    Without WordNet, return `fallback_lemma` (e.g. the spaCy `token.lemma_` of the verb) or the verb itself.
+    """
+    if _get_lemmatizer() is None:
+        return fallback_lemma or verb
+    return _wordnet_verb_lemma(verb)
 
 def getObjectPronun(subjext_pronoun):
     """Get object pronoun of the given subject pronoun"""
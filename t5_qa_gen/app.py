@@ -4,13 +4,18 @@ from transformers import (
     T5ForConditionalGeneration,
     T5TokenizerFast as T5Tokenizer
 )
-import numpy as np
-from tqdm import tqdm
+from control_grid import COAC, COQC, build_control_grid, build_qa_prompt
+from microbatch import create_batcher, length_buckets
+
 MODEL_NAME = 't5-small'
-SEP_TOKEN = '</s>'
 SOURCE_MAX_TOKEN_LEN = 512
 TARGET_MAX_TOKEN_LEN = 256
 
+# Number of prompts decoded by one generate call, lower it if a batch does not fit in memory
+T5QG_BATCH_SIZE = 27
+# Pad every batch to its longest prompt instead of SOURCE_MAX_TOKEN_LEN ('max_length')
+PADDING_STRATEGY = 'longest'
+
 device = "cpu"
 tokenizer = T5Tokenizer.from_pretrained(MODEL_NAME)
 TOKENIZER_LEN = len(tokenizer)
@@ -25,41 +30,8 @@ peft_model.to(device)
 
 app = Flask(__name__)
 
-def generate_qa(paragraph, lqc, lac, coqc, coac, mpos) -> str:
-    task_prefix = "Question generation: "
-    control_qg = f"LQC {lqc} LAC {lac} COQC {coqc} COAC {coac} POS {mpos}"
-    input_text = f"{task_prefix} {control_qg} {SEP_TOKEN} {paragraph}"
-    
-    source_encoding = tokenizer(
-        input_text,
-        max_length=SOURCE_MAX_TOKEN_LEN,
-        padding='max_length',
-        truncation=True,
-        return_attention_mask=True,
-        add_special_tokens=True,
-        return_tensors='pt'
-    )
-
-    generated_ids = peft_model.generate(
-        input_ids=source_encoding['input_ids'].to(device),
-        attention_mask=source_encoding['attention_mask'].to(device),
-        num_beams=10,
-        temperature=1.5,
-        repetition_penalty=2.5,
-        top_p=0.95,
-        do_sample=True,
-        max_length=TARGET_MAX_TOKEN_LEN,
-        early_stopping=True,
-        use_cache=True
-    )
-
-    preds = {
-        tokenizer.decode(generated_id, skip_special_tokens=False, clean_up_tokenization_spaces=True)
-        for generated_id in generated_ids
-    }
-
-    result = ' '.join(preds)
-    result = result.replace('<pad>', '')
+def parse_qa(prediction: str):
+    result = prediction.replace('<pad>', '')
     result = result.replace('</s>', '')
     result = result.strip()
     list_result = result.split(';')
@@ -72,46 +44,101 @@ def generate_qa(paragraph, lqc, lac, coqc, coac, mpos) -> str:
     return question.strip(), answer.strip()
 
 
-def generate(context):
-    qa_pairs = []
-    mean_values = {
-        'lqc': 0.097,
-        'lac': 0.030,
-        'mpos': 0.435
-    }
-
-    # Create ranges near the mean values
-    stretched_range = lambda mean: np.linspace(mean * 0.65, mean * 1.35, 3).round(3).tolist()
-
-    lqc_range = stretched_range(mean_values['lqc'])
-    lac_range = stretched_range(mean_values['lac'])
-    mpos_range = stretched_range(mean_values['mpos'])
-    coqc = 0.047
-    coac = 0.026
-    
-    total_iterations = len(lqc_range) * len(lac_range) * len(mpos_range)
-    
-    with tqdm(total=total_iterations, desc="Generating QA pairs") as pbar:
-        for lqc in lqc_range:
-            for lac in lac_range:
-                for mpos in mpos_range:
-                    question, answer = generate_qa(context, lqc, lac, coqc, coac, mpos)
-                    qa_pairs.append({'question': question, 'answer': answer})
-                    pbar.update(1)
-                    
-    return qa_pairs
+def generate_qa_batch(input_texts, padding=PADDING_STRATEGY, batch_size=T5QG_BATCH_SIZE):
+    """
+    Generate a (question, answer) pair per prompt. Prompts of similar length are decoded together
+    in batches of at most `batch_size`, each padded to its longest prompt (or to SOURCE_MAX_TOKEN_LEN
+    when padding='max_length').
+    """
+    encodings = tokenizer(
+        input_texts,
+        max_length=SOURCE_MAX_TOKEN_LEN,
+        truncation=True,
+        add_special_tokens=True,
+    )
+
+    results = [None] * len(input_texts)
+    for bucket in length_buckets(encodings['input_ids'], batch_size):
+        source_encoding = tokenizer.pad(
+            {'input_ids': [encodings['input_ids'][i] for i in bucket]},
+            padding=padding,
+            max_length=SOURCE_MAX_TOKEN_LEN,
+            return_attention_mask=True,
+            return_tensors='pt'
+        )
+
+        generated_ids = peft_model.generate(
+            input_ids=source_encoding['input_ids'].to(device),
+            attention_mask=source_encoding['attention_mask'].to(device),
+            num_beams=10,
+            temperature=1.5,
+            repetition_penalty=2.5,
+            top_p=0.95,
+            do_sample=True,
+            max_length=TARGET_MAX_TOKEN_LEN,
+            early_stopping=True,
+            use_cache=True
+        )
+
+        for i, generated_id in zip(bucket, generated_ids):
+            pred = tokenizer.decode(generated_id, skip_special_tokens=False, clean_up_tokenization_spaces=True)
+            results[i] = parse_qa(pred)
+    return results
+
+
+# Opt-in micro-batching of prompts coming from concurrent requests (see microbatch.py)
+batcher = create_batcher(generate_qa_batch)
+
+
+def generate_qa(paragraph, lqc, lac, coqc, coac, mpos) -> str:
+    input_text = build_qa_prompt(paragraph, lqc, lac, coqc, coac, mpos)
+    if batcher is not None:
+        return batcher.submit(input_text)
+    return generate_qa_batch([input_text])[0]
+
+
+def generate(context, grid=None):
+    """
+    Generate one QA pair per control point. `grid` holds the keyword arguments of `build_control_grid`
+    (size, stretch, ranges, points). The prompts are decoded in length-bucketed batches of T5QG_BATCH_SIZE.
+    Only requests with at most MICROBATCH_MAX_BATCH prompts go through the micro-batcher, larger ones would
+    be split into several batches of the batcher instead.
+    """
+    control_points = build_control_grid(**(grid or {}))
+    input_texts = [
+        build_qa_prompt(context, lqc, lac, COQC, COAC, mpos)
+        for lqc, lac, mpos in control_points
+    ]
+
+    if batcher is not None and len(input_texts) <= batcher.max_batch_size:
+        results = batcher.submit_many(input_texts)
+    else:
+        results = generate_qa_batch(input_texts)
+
+    return [{'question': question, 'answer': answer} for question, answer in results]
 
 @app.route('/generate_t5_qa', methods=['POST'])
 def generate_t5_qa():
     data = request.json
     context = data.get('context', None)
+    grid = data.get('grid', None)
     if not context:
         return jsonify({"error": "No text provided"}), 400
+    if grid is not None and not isinstance(grid, dict):
+        return jsonify({"error": "Grid should be an object"}), 400
     try:
-        qa_pairs = generate(context)
+        qa_pairs = generate(context, grid)
         return jsonify(qa_pairs)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/batching_stats', methods=['GET'])
+def batching_stats():
+    if batcher is None:
+        return jsonify({"enabled": False})
+    return jsonify(batcher.stats())
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=8000, debug=True)
\ No newline at end of file
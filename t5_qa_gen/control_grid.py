@@ -0,0 +1,92 @@
+"""
+Prompts and control codes of the T5 question generator, kept apart from app.py so that they can be used
+without loading the model (see benchmark_padding.py).
+"""
+import itertools
+import math
+
+import numpy as np
+
+SEP_TOKEN = '</s>'
+
+# Control codes of the question generator, the default grid spreads 3 values around each mean
+CONTROL_MEANS = {
+    'lqc': 0.097,
+    'lac': 0.030,
+    'mpos': 0.435
+}
+COQC = 0.047
+COAC = 0.026
+GRID_SIZE = 3
+GRID_STRETCH = 0.35
+# Largest number of control points (prompts) of one request
+MAX_CONTROL_POINTS = 125
+
+
+def build_qa_prompt(paragraph, lqc, lac, coqc, coac, mpos) -> str:
+    task_prefix = "Question generation: "
+    control_qg = f"LQC {lqc} LAC {lac} COQC {coqc} COAC {coac} POS {mpos}"
+    return f"{task_prefix} {control_qg} {SEP_TOKEN} {paragraph}"
+
+
+def build_control_grid(size=GRID_SIZE, stretch=GRID_STRETCH, ranges=None, points=None):
+    """
+    Build the list of (lqc, lac, mpos) control points used to prompt the model.
+
+    Args:
+    -----
+    size: int
+        Number of values per control, spread evenly over mean * (1 - stretch) .. mean * (1 + stretch)
+    stretch: float
+        Relative distance of the first and last value from the mean
+    ranges: dict
+        Explicit values for some of the controls, e.g. {'lqc': [0.08, 0.1]}, the others use the stretched range
+    points: list
+        Explicit (lqc, lac, mpos) points, used as is instead of a grid
+
+    At least one and at most MAX_CONTROL_POINTS points are accepted.
+
+    Returns:
+    --------
+    List[Tuple[float, float, float]]
+    """
+    if points is not None:
+        if not points:
+            raise ValueError("At least one control point is required")
+        if len(points) > MAX_CONTROL_POINTS:
+            raise ValueError(f"At most {MAX_CONTROL_POINTS} control points are accepted, got {len(points)}")
+        grid = []
+        for point in points:
+            if isinstance(point, dict):
+                missing_controls = set(CONTROL_MEANS) - set(point)
+                if missing_controls:
+                    raise ValueError(f"Control point {point} is missing {sorted(missing_controls)}")
+                point = (point['lqc'], point['lac'], point['mpos'])
+            if len(point) != 3:
+                raise ValueError(f"Control point {point} should have 3 values (lqc, lac, mpos)")
+            grid.append(tuple(float(value) for value in point))
+        return grid
+
+    if size < 1:
+        raise ValueError("Grid size should be at least 1")
+    ranges = ranges or {}
+    if not isinstance(ranges, dict):
+        raise TypeError("Ranges should be an object mapping controls to lists of values")
+    unknown_controls = set(ranges) - set(CONTROL_MEANS)
+    if unknown_controls:
+        raise ValueError(f"Unknown controls: {sorted(unknown_controls)}")
+    ranges = {control: [float(value) for value in values] for control, values in ranges.items()}
+    empty_controls = [control for control, values in ranges.items() if not values]
+    if empty_controls:
+        raise ValueError(f"Ranges should have at least one value, got none for {sorted(empty_controls)}")
+    num_points = math.prod(len(ranges[control]) if control in ranges else size for control in CONTROL_MEANS)
+    if num_points > MAX_CONTROL_POINTS:
+        raise ValueError(f"At most {MAX_CONTROL_POINTS} control points are accepted, the grid has {num_points}")
+
+    # Create ranges near the mean values
+    stretched_range = lambda mean: np.linspace(mean * (1 - stretch), mean * (1 + stretch), size).round(3).tolist()
+
+    lqc_range = ranges.get('lqc', stretched_range(CONTROL_MEANS['lqc']))
+    lac_range = ranges.get('lac', stretched_range(CONTROL_MEANS['lac']))
+    mpos_range = ranges.get('mpos', stretched_range(CONTROL_MEANS['mpos']))
+    return list(itertools.product(lqc_range, lac_range, mpos_range))
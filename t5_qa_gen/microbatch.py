@@ -0,0 +1,112 @@
+# The same module is copied into distractor_gen, paraphraser and t5_qa_gen, keep the copies identical.
+# Each service runs as a script with its own directory as import root, so they do not share a package.
+import os
+import threading
+import time
+from concurrent.futures import Future
+from queue import Queue, Empty
+
+# Micro-batching is opt-in, the knobs are read from the environment when the service starts
+MICROBATCH_ENABLED = os.environ.get('MICROBATCH_ENABLED', '0') == '1'
+MICROBATCH_MAX_BATCH = int(os.environ.get('MICROBATCH_MAX_BATCH', '8'))
+MICROBATCH_MAX_WAIT_MS = float(os.environ.get('MICROBATCH_MAX_WAIT_MS', '15'))
+
+
+class MicroBatcher:
+    """
+    Collects items submitted by concurrent request threads and runs them through `batch_fn` together.
+    A batch is flushed as soon as it holds `max_batch_size` items, or when its first item has waited `max_wait_ms`.
+    `batch_fn` takes a list of items and returns the list of their results in the same order.
+    """
+
+    def __init__(self, batch_fn, max_batch_size: int = 8, max_wait_ms: float = 15):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue = Queue()
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._batches = 0
+        self._batched_items = 0
+        self._max_queue_depth = 0
+        self._total_wait = 0.0
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, item):
+        """Block until the result of a single item is available"""
+        return self.submit_many([item])[0]
+
+    def submit_many(self, items):
+        """Enqueue several items at once and block until all of their results are available"""
+        futures = []
+        for item in items:
+            future = Future()
+            self._queue.put((item, future, time.monotonic()))
+            futures.append(future)
+        with self._lock:
+            self._submitted += len(items)
+            self._max_queue_depth = max(self._max_queue_depth, self._queue.qsize())
+        return [future.result() for future in futures]
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.monotonic()
+            try:
+                results = self.batch_fn([item for item, _, _ in batch])
+                if len(results) != len(batch):
+                    raise ValueError(f'batch_fn returned {len(results)} results for {len(batch)} items')
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+            with self._lock:
+                self._batches += 1
+                self._batched_items += len(batch)
+                self._total_wait += sum(started - submitted_at for _, _, submitted_at in batch)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'enabled': True,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait_ms,
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self._max_queue_depth,
+                'submitted': self._submitted,
+                'batches': self._batches,
+                'avg_batch_size': self._batched_items / self._batches if self._batches else 0.0,
+                'avg_queue_wait_ms': 1000 * self._total_wait / self._batched_items if self._batched_items else 0.0,
+            }
+
+
+def length_buckets(sequences, batch_size: int):
+    """
+    Group the indices of `sequences` into batches of at most `batch_size` items of similar length,
+    so that padding every batch to its longest item wastes as few positions as possible.
+    """
+    order = sorted(range(len(sequences)), key=lambda i: len(sequences[i]))
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+def create_batcher(batch_fn):
+    """Return a MicroBatcher configured from the environment, or None when micro-batching is disabled"""
+    if not MICROBATCH_ENABLED:
+        return None
+    return MicroBatcher(batch_fn, max_batch_size=MICROBATCH_MAX_BATCH, max_wait_ms=MICROBATCH_MAX_WAIT_MS)